@@ -1,4 +1,36 @@
 from django.contrib import admin
-from .models import Notification
+from .models import Delivery, Notification, ScheduledNotification
+from .notifications import replay_dead
 
-admin.site.register(Notification)
+
+class DeliveryInline(admin.TabularInline):
+    model = Delivery
+    extra = 0
+    readonly_fields = ('channel', 'status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at',
+                       'provider_message_id', 'updated_at')
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'message', 'date_add')
+    list_select_related = ('user', 'message')
+    inlines = (DeliveryInline,)
+
+
+@admin.register(Delivery)
+class DeliveryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'notification', 'channel', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('channel', 'status')
+    actions = ('replay_dead_letters',)
+
+    @admin.action(description='Повторить отправку (dead-letter)')
+    def replay_dead_letters(self, request, queryset):
+        replayed = replay_dead(queryset)
+        self.message_user(request, f'Возвращено в очередь: {replayed}.')
+
+
+@admin.register(ScheduledNotification)
+class ScheduledNotificationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'message', 'channels', 'due_at', 'interval')
+    list_select_related = ('user', 'message')
+    date_hierarchy = 'due_at'
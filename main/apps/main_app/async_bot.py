@@ -0,0 +1,73 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+from telebot import types
+from ..users_app import login_tokens
+from . import metrics
+from loguru import logger
+import asyncio
+
+
+def create_bot(token=None, concurrency=None):
+    '''
+    Асинхронный Telegram-бот на AsyncTeleBot.
+    Все запросы к API идут через одну aiohttp-сессию telebot,
+    одновременно обрабатывается не больше ASYNC_BOT_CONCURRENCY обновлений.
+
+    :param token: Токен бота, по умолчанию TELEGRAM_BOT_TOKEN.
+    :param concurrency: Лимит одновременно обрабатываемых обновлений.
+    :return: Настроенный AsyncTeleBot.
+    '''
+    concurrency = concurrency or settings.ASYNC_BOT_CONCURRENCY
+    asyncio_helper.REQUEST_LIMIT = concurrency  # размер пула соединений общей aiohttp-сессии
+    bot = AsyncTeleBot(token or settings.TELEGRAM_BOT_TOKEN)
+    limiter = asyncio.Semaphore(concurrency)
+
+    @bot.message_handler(commands=['start'])
+    async def start(message):
+        async with limiter:
+            with metrics.BOT_START_SECONDS.labels('async').time():
+                metrics.BOT_START_TOTAL.labels('async', await handle_start(bot, message)).inc()
+
+    return bot
+
+
+# ORM вызывается в одном общем потоке (thread_sensitive): в потоках одноразового пула соединения с БД
+# оставались бы открытыми, а записи в SQLite всё равно идут по одной.
+login = sync_to_async(login_tokens.bind)
+
+
+async def handle_start(bot, message):
+    '''
+    АВТОРИЗАЦИЯ ЧЕРЕЗ ТЕЛЕГРАМ БОТа (асинхронно).
+
+    :return: Результат для метрик: login, no_token или error.
+    '''
+    telegram_id = message.chat.id
+    token = message.text.split()[1] if len(message.text.split()) > 1 else None
+    if token is None:
+        await bot.send_message(chat_id=telegram_id,
+                               text="Для того, что-бы войти в аккаунт перейдите по ссылке на сайте")
+        return 'no_token'
+    try:
+        await login(telegram_id, message.from_user.username, token)
+        markup = types.InlineKeyboardMarkup()
+        markup.add(types.InlineKeyboardButton("перейти на сайт",
+                                              url=f'http://{settings.DOMAIN}/users_app/login/'))
+        await bot.send_message(telegram_id, f"Вход выполнен успешно", reply_markup=markup)
+        return 'login'
+    except Exception as e:
+        logger.error(f'\nОшибка при обработке сообщения: {e}')
+        await bot.send_message(chat_id=telegram_id,
+                               text="Произошла ошибка при попытке входа. Попробуйте еще раз.")
+        return 'error'
+
+
+async def run_polling():
+    ''' Запуск асинхронного бота через infinity_polling. '''
+    bot = create_bot()
+    try:
+        await bot.infinity_polling()
+    finally:
+        await bot.close_session()
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+import threading
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(channel):
+    '''
+    Бэкенд канала из настройки NOTIFICATION_CHANNELS.
+    Создаётся один раз на процесс и переиспользуется всеми потоками.
+
+    :param channel: Название канала.
+    :return: Экземпляр BaseChannelBackend.
+    '''
+    backend = _backends.get(channel)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(channel)
+            if backend is None:
+                backend = _backends[channel] = _build_backend(channel)
+    return backend
+
+
+def _build_backend(channel):
+    try:
+        config = settings.NOTIFICATION_CHANNELS[channel]
+    except KeyError:
+        raise ImproperlyConfigured(f'Канал {channel!r} не описан в NOTIFICATION_CHANNELS')
+    return import_string(config['BACKEND'])(channel, **config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def _reset_backends(setting, **kwargs):
+    ''' Сброс бэкендов при override_settings(NOTIFICATION_CHANNELS=...) в тестах. '''
+    if setting == 'NOTIFICATION_CHANNELS':
+        _backends.clear()
@@ -0,0 +1,75 @@
+from asgiref.sync import sync_to_async
+
+
+class PermanentDeliveryError(Exception):
+    ''' Ошибка, которую бесполезно повторять: нет адреса, неверный номер и т.п. '''
+
+
+class DeliveryTimeout(TimeoutError):
+    '''
+    Отправка не уложилась в NOTIFICATION_CHANNEL_TIMEOUT, и её результат неизвестен:
+    сообщение могло уйти. Попытка учитывается, но аренда доставки не снимается,
+    поэтому повтор начнётся не раньше её истечения.
+    '''
+
+
+class BaseChannelBackend:
+    '''
+    Базовый бэкенд канала доставки.
+
+    Наследник задаёт address_field и реализует send; send_batch по умолчанию
+    отправляет получателям по одному, бэкенды с пакетным API его переопределяют.
+    Конвейер отправки делит получателей на пачки по batch_size
+    и отправляет пачки параллельно.
+    '''
+
+    batch_size = 1  # получателей в одном вызове send_batch
+    address_field = None  # поле пользователя с адресом в канале
+    missing_address = 'НЕТ АДРЕСА ПОЛУЧАТЕЛЯ'
+
+    def __init__(self, channel, **options):
+        self.channel = channel
+        self.options = options
+
+    def address(self, user):
+        ''' Адрес получателя в канале; без адреса отправка невозможна. '''
+        value = getattr(user, self.address_field)
+        if not value:
+            raise PermanentDeliveryError(self.missing_address)
+        return value
+
+    def send(self, user, message):
+        '''
+        Отправка сообщения одному получателю.
+
+        :return: id сообщения у провайдера.
+        '''
+        raise NotImplementedError
+
+    async def asend(self, user, message):
+        ''' Асинхронная отправка; по умолчанию send в пуле потоков. '''
+        return await sync_to_async(self.send, thread_sensitive=False)(user, message)
+
+    def send_batch(self, recipients, message):
+        '''
+        Отправка одного сообщения многим получателям.
+        Ошибка одного получателя не прерывает пачку.
+
+        :param recipients: Список пользователей.
+        :param message: Текст сообщения.
+        :return: Список той же длины: id сообщения у провайдера или исключение.
+        '''
+        results = []
+        for user in recipients:
+            try:
+                results.append(self.send(user, message))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def is_permanent(self, error):
+        '''
+        Отличает постоянные ошибки от временных.
+        Временные (сеть, таймаут, 429, 5xx) повторяются с задержкой, постоянные — нет.
+        '''
+        return isinstance(error, PermanentDeliveryError)
@@ -0,0 +1,21 @@
+from .locmem import LocmemBackend
+import json
+
+
+class FileBackend(LocmemBackend):
+    '''
+    Локальный бэкенд, который дописывает сообщения в файл (JSON по строке на сообщение),
+    чтобы их было видно из другого процесса, например из воркера во время замеров.
+
+    Параметры (OPTIONS): file_path — путь к файлу, остальные как у LocmemBackend.
+    '''
+
+    def __init__(self, channel, file_path, **options):
+        super().__init__(channel, **options)
+        self.file_path = file_path
+
+    def record(self, recipients, message, ids):
+        with open(self.file_path, 'a', encoding='utf-8') as f:
+            for user, message_id in zip(recipients, ids):
+                f.write(json.dumps({'channel': self.channel, 'user_id': user.pk, 'message': message,
+                                    'id': message_id}, ensure_ascii=False) + '\n')
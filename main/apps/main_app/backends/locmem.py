@@ -0,0 +1,46 @@
+from collections import namedtuple
+from .base import BaseChannelBackend
+import itertools
+import threading
+import time
+
+SentMessage = namedtuple('SentMessage', 'channel user_id message')
+
+# Отправленные сообщения всех локальных бэкендов, как django.core.mail.outbox.
+outbox = []
+_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+class LocmemBackend(BaseChannelBackend):
+    '''
+    Локальный бэкенд для тестов и замеров: ничего не отправляет,
+    а складывает сообщения в locmem.outbox.
+
+    Параметры (OPTIONS):
+        latency — секунд «сетевой» задержки на один вызов send_batch;
+        batch_size — получателей в одной пачке.
+    '''
+
+    def __init__(self, channel, latency=0, batch_size=1000, **options):
+        super().__init__(channel, **options)
+        self.latency = latency
+        self.batch_size = batch_size
+
+    def address(self, user):
+        return user.pk
+
+    def send(self, user, message):
+        return self.send_batch([user], message)[0]
+
+    def send_batch(self, recipients, message):
+        if self.latency:
+            time.sleep(self.latency)
+        with _lock:
+            ids = [f'{self.channel}-{next(_ids)}' for _ in recipients]
+            self.record(recipients, message, ids)
+        return ids
+
+    def record(self, recipients, message, ids):
+        ''' Сохраняет отправленные сообщения (вызывается под блокировкой). '''
+        outbox.extend(SentMessage(self.channel, self.address(user), message) for user in recipients)
@@ -0,0 +1,26 @@
+from twilio.base.exceptions import TwilioRestException
+from ..transports import sms
+from .base import BaseChannelBackend
+
+
+class SmsBackend(BaseChannelBackend):
+    '''
+    СМС через общий клиент Twilio.
+    У Twilio нет пакетной отправки, поэтому каждое СМС — отдельная пачка,
+    а пачки отправляются параллельно через пул соединений клиента.
+    '''
+
+    address_field = 'phone_number'
+    missing_address = 'УКАЖИТЕ СВОЙ НОМЕР ТЕЛЕФОНА'
+
+    def send(self, user, message):
+        ''' Возвращает SID сообщения Twilio. '''
+        return sms.send_sms(self.address(user), message).sid
+
+    async def asend(self, user, message):
+        return (await sms.asend_sms(self.address(user), message)).sid
+
+    def is_permanent(self, error):
+        if isinstance(error, TwilioRestException):
+            return error.status in (400, 404)  # неверный номер, номер отписан
+        return super().is_permanent(error)
@@ -0,0 +1,26 @@
+from telebot.apihelper import ApiTelegramException
+from ..transports import telegram
+from .base import BaseChannelBackend
+
+
+class TelegramBackend(BaseChannelBackend):
+    '''
+    Telegram через общий планировщик с лимитами API.
+    Bot API отправляет сообщения по одному, поэтому каждое сообщение — отдельная пачка;
+    темп параллельных отправок выравнивает планировщик.
+    '''
+
+    address_field = 'telegram_id'
+    missing_address = 'ВОЙДИТЕ ЧЕРЕЗ ТЕЛЕГРАМ'
+
+    def send(self, user, message):
+        ''' Возвращает id сообщения в чате. '''
+        return telegram.send_message(self.address(user), message).message_id
+
+    async def asend(self, user, message):
+        return (await telegram.asend_message(self.address(user), message))['message_id']
+
+    def is_permanent(self, error):
+        if isinstance(error, ApiTelegramException):
+            return error.error_code in (400, 403)  # чат не найден, бот заблокирован
+        return super().is_permanent(error)
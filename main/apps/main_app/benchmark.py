@@ -0,0 +1,206 @@
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .backends import _backends
+from . import bot
+from .broadcast import broadcast
+from .management.commands.send_notifications import Command as Worker
+from .models import Delivery, DeliveryStatus, Message, Notification
+from .notifications import send_notification
+from .transports import email, sms, telegram
+from .workers import run_pool
+from ..users_app.models import User
+import asyncio
+import math
+import threading
+import time
+
+MESSAGE = 'Замер производительности'
+
+
+def reset_transports():
+    ''' Сброс общих клиентов провайдеров, чтобы они пересоздались с текущими настройками. '''
+    email.get_session().close()
+    email._session = None
+    sms._client = None
+    telegram._scheduler = None
+    bot._bot = None
+    _backends.clear()
+
+
+def clear_notifications():
+    Notification.objects.all().delete()
+    Message.objects.all().delete()
+
+
+def make_users(prefix, count):
+    ''' Пользователи с адресами во всех каналах. '''
+    User.objects.bulk_create([
+        User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com',
+             phone_number=f'+7916{i:07d}', telegram_id=10 ** 9 + i)
+        for i in range(count)
+    ])
+    return list(User.objects.filter(username__startswith=prefix).order_by('id'))
+
+
+def percentile(values, q):
+    ''' Перцентиль q (0..100) методом ближайшего ранга. '''
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)] if values else 0.0
+
+
+def summarize(scenario, latencies, queries, errors, elapsed, ops=None):
+    '''
+    Итог сценария.
+
+    :param latencies: Время каждого вызова, секунд.
+    :param queries: Всего SQL-запросов.
+    :param errors: Ошибок и недоставленных сообщений.
+    :param elapsed: Время всего сценария, секунд.
+    :param ops: Число операций, по умолчанию по числу вызовов.
+    '''
+    ops = len(latencies) if ops is None else ops
+    return {
+        'scenario': scenario,
+        'ops': ops,
+        'ops_per_sec': ops / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_op': queries / ops if ops else 0.0,
+        'errors': errors,
+    }
+
+
+def run_send(users):
+    ''' send_notification по всем каналам: по одному вызову на пользователя. '''
+    latencies, queries, errors = [], 0, 0
+    started = time.perf_counter()
+    for user in users:
+        with CaptureQueriesContext(connection) as captured:
+            begin = time.perf_counter()
+            deliveries = send_notification(user, MESSAGE)
+            latencies.append(time.perf_counter() - begin)
+        queries += len(captured)
+        errors += sum(delivery.status != DeliveryStatus.SENT for delivery in deliveries)
+    return summarize('send_notification', latencies, queries, errors, time.perf_counter() - started)
+
+
+def run_view(user, url_name, iterations):
+    ''' Синхронное представление через тестовый клиент. '''
+    client = Client()
+    client.force_login(user)
+    path = reverse(url_name)
+    latencies, queries, errors = [], 0, 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            begin = time.perf_counter()
+            response = client.get(path, headers={'Idempotency-Key': f'bench-{i}'})  # каждый вызов — новая отправка
+            latencies.append(time.perf_counter() - begin)
+        queries += len(captured)
+        errors += response.status_code != 200
+    return summarize(f'view {path}', latencies, queries, errors, time.perf_counter() - started)
+
+
+class QueryCounter:
+    '''
+    Счётчик SQL-запросов во всех потоках.
+    Async-представления обращаются к ORM из потоков sync_to_async, у каждого из которых
+    своё соединение, поэтому счётчик ставится на каждое новое соединение.
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+
+
+def run_async_view(user, url_name, iterations):
+    '''
+    Асинхронное представление через AsyncClient.
+    Все запросы идут в одном event loop, как под uvicorn, поэтому клиенты провайдеров переиспользуются.
+    '''
+    client = AsyncClient()
+    client.force_login(user)
+    path = reverse(url_name)
+    latencies, errors = [], 0
+
+    async def requests():
+        nonlocal errors
+        try:
+            for i in range(iterations):
+                begin = time.perf_counter()
+                response = await client.get(path, headers={'Idempotency-Key': f'bench-{i}'})
+                latencies.append(time.perf_counter() - begin)
+                errors += response.status_code != 200
+        finally:
+            await telegram._get_session().close()
+            await sms.get_async_client().http_client.close()
+
+    with QueryCounter() as queries:
+        started = time.perf_counter()
+        asyncio.run(requests())
+        elapsed = time.perf_counter() - started
+    errors += Delivery.objects.exclude(status=DeliveryStatus.SENT).count()
+    return summarize(f'async view {path}', latencies, queries.count, errors, elapsed)
+
+
+def run_bulk(users, batch_size):
+    '''
+    Массовая рассылка и её доставка воркером.
+    Операция — одна доставка, задержки — время обработки пачек воркером.
+    '''
+    worker = Worker()
+    latencies, ops = [], 0
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        broadcast(users, MESSAGE, batch_size=batch_size)
+        while True:
+            begin = time.perf_counter()
+            processed = worker.process_batch(batch_size)
+            if not processed:
+                break
+            latencies.append(time.perf_counter() - begin)
+            ops += processed
+        elapsed = time.perf_counter() - started
+    errors = Delivery.objects.exclude(status=DeliveryStatus.SENT).count()
+    return summarize('broadcast + worker', latencies, len(captured), errors, elapsed, ops=ops)
+
+
+def run_workers(users, batch_size, workers, overrides):
+    '''
+    Массовая рассылка и её доставка пулом из workers процессов (send_notifications --workers)
+    на той же файловой БД. Операция — одна доставка, задержки не замеряются:
+    сравнивается пропускная способность при разном числе процессов.
+
+    :param overrides: Настройки заглушек провайдеров для процессов пула.
+    '''
+    from telebot import apihelper
+
+    broadcast(users, MESSAGE, batch_size=batch_size)
+    ops = Delivery.objects.count()
+    database = connection.settings_dict
+    connection.close()  # воркеры работают со своими соединениями
+    started = time.perf_counter()
+    run_pool(workers, database=database, overrides=overrides, api_url=apihelper.API_URL, quiet=True,
+             batch_size=batch_size, once=True)
+    elapsed = time.perf_counter() - started
+    errors = Delivery.objects.exclude(status=DeliveryStatus.SENT).count()
+    return summarize(f'пул воркеров x{workers}', [], 0, errors, elapsed, ops=ops)
@@ -0,0 +1,66 @@
+from django.conf import settings
+from ..users_app import login_tokens
+from . import metrics
+from loguru import logger
+import telebot
+import threading
+
+_bot = None
+_bot_lock = threading.Lock()
+
+
+def get_bot():
+    '''
+    Общий синхронный Telegram-бот процесса.
+    Создаётся при первом обращении (отправка уведомления, webhook, run_bot),
+    а не при импорте: веб-воркерам и командам manage.py, которые не работают с Telegram,
+    клиент бота и обработчики не нужны.
+    '''
+    global _bot
+    if _bot is None:
+        with _bot_lock:
+            if _bot is None:
+                _bot = _create_bot()
+    return _bot
+
+
+def _create_bot():
+    # Обновления обрабатываются в вызывающем потоке: webhook — в потоке запроса Django,
+    # который сам закрывает соединения с базой, а ошибки обработчиков доходят до представления,
+    # а не теряются в пуле потоков TeleBot.
+    bot = telebot.TeleBot(settings.TELEGRAM_BOT_TOKEN, threaded=False)
+
+    @bot.message_handler(commands=['start'])
+    def start(message):
+        ''' АВТОРИЗАЦИЯ ЧЕРЕЗ ТЕЛЕГРАМ БОТа. '''
+        with metrics.BOT_START_SECONDS.labels('sync').time():
+            metrics.BOT_START_TOTAL.labels('sync', login(bot, message)).inc()
+
+    return bot
+
+
+def login(bot, message):
+    '''
+    Вход по токену из команды /start <токен>.
+
+    :return: Результат для метрик: login, no_token или error.
+    '''
+    telegram_id = message.chat.id
+    token = message.text.split()[1] if len(message.text.split()) > 1 else None
+    if token is not None:
+        try:
+            login_tokens.bind(telegram_id, message.from_user.username, token)
+            markup = telebot.types.InlineKeyboardMarkup()
+            markup.add(telebot.types.InlineKeyboardButton("перейти на сайт",
+                                                          url=f'http://{settings.DOMAIN}/users_app/login/'))
+            bot.send_message(message.chat.id, f"Вход выполнен успешно", reply_markup=markup)
+            return 'login'
+        except Exception as e:
+            logger.error(f'\nОшибка при обработке сообщения: {e}')
+            bot.send_message(chat_id=telegram_id,
+                             text="Произошла ошибка при попытке входа. Попробуйте еще раз.")
+            return 'error'
+    else:
+        bot.send_message(chat_id=telegram_id,
+                         text="Для того, что-бы войти в аккаунт перейдите по ссылке на сайте")
+        return 'no_token'
@@ -0,0 +1,66 @@
+from django.db.models import Q
+from .models import Delivery, Message, Notification
+from .notifications import CHANNELS, channel_flag
+from ..users_app.models import User
+from loguru import logger
+from functools import reduce
+import operator
+
+BROADCAST_BATCH_SIZE = 1000  # сколько уведомлений создавать одним INSERT
+
+# Готовые аудитории рассылки: название -> фильтр пользователей.
+AUDIENCES = {
+    'all': {},
+    'telegram': {'can_telegram': True},
+    'email': {'can_email': True},
+    'sms': {'can_sms': True},
+}
+
+
+def get_audience(name):
+    ''' Возвращает QuerySet активных пользователей выбранной аудитории. '''
+    return User.objects.filter(is_active=True, **AUDIENCES[name])
+
+
+def broadcast(users, message, channels=CHANNELS, batch_size=BROADCAST_BATCH_SIZE):
+    '''
+    Массовая рассылка: ставит в очередь одно сообщение для всех пользователей из queryset.
+    Получатели выбираются одним запросом по флагам доступных каналов (User.can_*):
+    пользователь получает доставки только в доступные ему каналы, а недостижимый
+    ни по одному из каналов не получает уведомления. Получатели читаются потоком через .iterator(),
+    уведомления и доставки создаются пачками через bulk_create, поэтому память ограничена размером пачки,
+    а число запросов растёт с числом пачек, а не пользователей.
+    Отправку выполняет воркер `send_notifications`.
+
+    :param users: QuerySet пользователей-получателей.
+    :param message: Текст сообщения.
+    :param channels: Каналы доставки.
+    :param batch_size: Размер пачки.
+    :return: Количество созданных уведомлений.
+    '''
+    body = Message.for_body(message)  # текст хранится один раз на всю рассылку
+    flags = {channel: channel_flag(channel) for channel in channels}
+    fields = sorted(set(filter(None, flags.values())))
+    if fields and all(flags.values()):
+        users = users.filter(reduce(operator.or_, (Q(**{field: True}) for field in fields)))
+    total = 0
+    batch = []
+    for user_id, *values in users.values_list('pk', *fields).iterator(chunk_size=batch_size):
+        reachable = dict(zip(fields, values))
+        batch.append((Notification(user_id=user_id, message=body),
+                      [channel for channel in channels if flags[channel] is None or reachable[flags[channel]]]))
+        if len(batch) >= batch_size:
+            total += _flush(batch)
+            batch = []
+    if batch:
+        total += _flush(batch)
+    logger.info(f'\nРАССЫЛКА поставлена в очередь: {total} уведомлений.')
+    return total
+
+
+def _flush(batch):
+    ''' Сохранение пачки пар (уведомление, доступные каналы). '''
+    Notification.objects.bulk_create([notification for notification, _ in batch])
+    Delivery.objects.bulk_create([Delivery(notification=notification, channel=channel)
+                                  for notification, channels in batch for channel in channels])
+    return len(batch)
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.compatibility, deploy=False)
+def check_provider_config(app_configs, **kwargs):
+    '''
+    Проверка конфигурации провайдеров при запуске (runserver, migrate, check, воркер, бот).
+    Без ключей канал не сможет отправлять сообщения, поэтому об этом лучше узнать сразу,
+    а не по ошибкам доставки.
+    '''
+    errors = [
+        Warning(f'Не задана переменная окружения {name}.',
+                hint='Добавьте её в .env или окружение процесса.', id='main_app.W001')
+        for name in settings.CONFIG.missing()
+    ]
+    errors += [
+        Warning(f'Некорректное значение {name}: {problem}.', id='main_app.W002')
+        for name, problem in settings.CONFIG.invalid()
+    ]
+    return errors
@@ -0,0 +1,100 @@
+'''
+Замер одновременной записи в SQLite из нескольких процессов: "веб" ставит уведомления в очередь,
+"бот" привязывает токены входа, как run_bot рядом с веб-воркерами.
+
+Процессы-писатели запускаются через multiprocessing (spawn) и настраивают Django сами,
+поэтому модуль не импортирует модели на верхнем уровне.
+'''
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+ROLES = ('web', 'bot')
+
+
+def _write(database, role, number, ops, barrier, results):
+    ''' Процесс-писатель: ops записей подряд, "database is locked" считается ошибкой. '''
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    from django.conf import settings
+    settings.DATABASES['default'] = database
+    django.setup()
+    from django.db import OperationalError
+    from ..users_app import login_tokens
+    from ..users_app.models import User
+    from .notifications import enqueue_notification
+
+    user = User.objects.get(username='concurrency')
+    latencies, locked = [], 0
+    barrier.wait()
+    started = time.perf_counter()
+    for i in range(ops):
+        begin = time.perf_counter()
+        try:
+            if role == 'web':
+                enqueue_notification(user, f'Конкурентная запись {number}-{i}', channels=('email',))
+            else:
+                telegram_id = 10 ** 10 + number * ops + i
+                login_tokens.bind(telegram_id, f'concurrency-{telegram_id}', f'concurrency-{telegram_id}')
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+        latencies.append(time.perf_counter() - begin)
+    results.put((latencies, locked, time.perf_counter() - started))
+
+
+def run_writers(database, writers, ops):
+    '''
+    Запуск writers "веб" и writers "бот" процессов одновременно.
+
+    :param database: Настройки DATABASES['default'] для процессов.
+    :param writers: Процессов каждой роли.
+    :param ops: Записей на процесс.
+    :return: (задержки, число ошибок "database is locked", время самого долгого процесса).
+    '''
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(writers * len(ROLES))
+    results = context.Queue()
+    processes = [context.Process(target=_write, args=(database, role, number, ops, barrier, results))
+                 for number, role in enumerate(ROLES * writers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    latencies = [latency for result in collected for latency in result[0]]
+    return latencies, sum(result[1] for result in collected), max(result[2] for result in collected)
+
+
+def run_concurrency(writers, ops):
+    '''
+    Сравнение SQLite по умолчанию (журнал DELETE, BEGIN DEFERRED) и настроек проекта
+    (WAL, busy_timeout, BEGIN IMMEDIATE) на одной и той же копии тестовой БД.
+    Операция — одна запись, ошибки — "database is locked".
+    '''
+    from django.db import connection
+    from ..users_app.models import User
+    from .benchmark import summarize
+
+    User.objects.get_or_create(username='concurrency')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Отдельная копия БД: соединения прошлых сценариев (потоки async-представлений) могут
+        # оставаться открытыми и не дали бы сменить режим журнала.
+        path = os.path.join(tmp, 'concurrency.sqlite3')
+        source, target = sqlite3.connect(connection.settings_dict['NAME']), sqlite3.connect(path)
+        try:
+            source.backup(target)
+            target.execute('PRAGMA journal_mode = DELETE')  # режим WAL сохраняется в файле, сбрасываем его
+        finally:
+            source.close()
+            target.close()
+        project = {**connection.settings_dict, 'NAME': path}
+        default = {**project, 'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}}
+        for label, database in (('sqlite по умолчанию', default), ('sqlite WAL', project)):
+            latencies, locked, elapsed = run_writers(database, writers, ops)
+            results.append(summarize(f'{label}: веб+бот x{writers}', latencies, 0, locked, elapsed))
+    return results
@@ -0,0 +1,17 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from functools import wraps
+
+
+def alogin_required(view_func):
+    '''
+    Аналог login_required для асинхронных представлений.
+    Пользователь из сессии загружается в потоке, чтобы не блокировать event loop.
+    '''
+    @wraps(view_func)
+    async def _wrapped_view(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return _wrapped_view
@@ -0,0 +1,211 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from telebot import apihelper
+import itertools
+import json
+import random
+import socketserver
+import threading
+import time
+
+
+class FakeProvider:
+    '''
+    Локальная заглушка провайдера для замеров: сервер в фоновом потоке,
+    который отвечает с задержкой latency секунд и с вероятностью error_rate возвращает ошибку.
+    '''
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.server = None
+
+    def make_server(self, address):
+        raise NotImplementedError
+
+    def start(self):
+        self.server = self.make_server(('127.0.0.1', 0))
+        self.server.provider = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def respond(self):
+        '''
+        Имитация обработки запроса провайдером.
+
+        :return: id ответа или None, если нужно ответить ошибкой.
+        '''
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            if self._random.random() < self.error_rate:
+                self.errors += 1
+                return None
+            return next(self._ids)
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    ''' Минимальный SMTP: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT без TLS и авторизации. '''
+
+    def handle(self):
+        self.reply('220 fake ESMTP')
+        for line in self.rfile:
+            command = line.decode(errors='replace').strip().split(' ', 1)[0].upper()
+            if command == 'EHLO':
+                self.reply('250-fake', '250 SIZE 10485760')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in self.rfile:
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                message_id = self.server.provider.respond()
+                self.reply('451 4.3.0 Temporary failure' if message_id is None else f'250 OK id={message_id}')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            elif command in ('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Command not implemented')
+
+    def reply(self, *lines):
+        self.wfile.write(''.join(f'{line}\r\n' for line in lines).encode())
+
+
+class _SmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeSmtpServer(FakeProvider):
+    ''' SMTP-приёмник: принимает письма и никуда их не отправляет. '''
+
+    def make_server(self, address):
+        return _SmtpServer(address, _SmtpHandler)
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящих API
+
+    def read_params(self):
+        ''' Параметры запроса из строки запроса, формы или JSON. '''
+        params = dict(parse_qsl(urlsplit(self.path).query))
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            params.update(json.loads(body or b'{}'))
+        else:
+            params.update(parse_qsl(body.decode()))
+        return params
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _TwilioHandler(_JsonHandler):
+
+    def do_POST(self):
+        params = self.read_params()
+        message_id = self.server.provider.respond()
+        if message_id is None:
+            self.send_json(500, {'code': 20500, 'message': 'Internal Server Error', 'status': 500})
+            return
+        self.send_json(201, {'sid': f'SM{message_id:032x}', 'status': 'queued',
+                             'to': params.get('To'), 'from': params.get('From'), 'body': params.get('Body')})
+
+
+class FakeTwilioServer(FakeProvider):
+    ''' Заглушка Twilio Messages API (POST /2010-04-01/Accounts/<sid>/Messages.json). '''
+
+    def make_server(self, address):
+        return ThreadingHTTPServer(address, _TwilioHandler)
+
+
+class _TelegramHandler(_JsonHandler):
+
+    def do_POST(self):
+        params = self.read_params()
+        message_id = self.server.provider.respond()
+        if message_id is None:
+            self.send_json(500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'})
+            return
+        self.send_json(200, {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            'from': {'id': 1, 'is_bot': True, 'first_name': 'fake'},
+            'text': params.get('text', ''),
+        }})
+
+
+class FakeTelegramServer(FakeProvider):
+    ''' Заглушка Telegram Bot API (POST /bot<token>/sendMessage). '''
+
+    def make_server(self, address):
+        return ThreadingHTTPServer(address, _TelegramHandler)
+
+
+@contextmanager
+def running_providers(latency=0.0, error_rate=0.0, seed=None):
+    '''
+    Запускает заглушки SMTP, Twilio и Telegram и направляет на них apihelper.API_URL.
+
+    :return: Словарь заглушек {'email': ..., 'sms': ..., 'telegram': ...}.
+    '''
+    providers = {
+        'email': FakeSmtpServer(latency, error_rate, seed).start(),
+        'sms': FakeTwilioServer(latency, error_rate, seed).start(),
+        'telegram': FakeTelegramServer(latency, error_rate, seed).start(),
+    }
+    api_url = apihelper.API_URL
+    apihelper.API_URL = providers['telegram'].url + '/bot{0}/{1}'
+    try:
+        yield providers
+    finally:
+        apihelper.API_URL = api_url
+        for provider in providers.values():
+            provider.stop()
+
+
+def provider_settings(providers):
+    ''' Настройки для override_settings, направляющие отправку на заглушки. '''
+    return {
+        'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+        'EMAIL_HOST': '127.0.0.1',
+        'EMAIL_PORT': providers['email'].port,
+        'EMAIL_USE_TLS': False,
+        'EMAIL_USE_SSL': False,
+        'EMAIL_HOST_USER': '',
+        'EMAIL_HOST_PASSWORD': '',
+        'TWILIO_API_URL': providers['sms'].url,
+        'TWILIO_ACCOUNT_SID': 'ACfake',
+        'TWILIO_AUTH_TOKEN': 'fake',
+        'TWILIO_PHONE_NUMBER': '+15005550006',
+        'TELEGRAM_BOT_TOKEN': '123456:fake',
+    }
@@ -0,0 +1,14 @@
+from django import forms
+from .broadcast import AUDIENCES
+from .notifications import CHANNELS
+
+
+class BroadcastForm(forms.Form):
+    """
+    Форма массовой рассылки.
+    """
+    message = forms.CharField(widget=forms.Textarea(attrs={'rows': 4, 'cols': 60}))
+    audience = forms.ChoiceField(choices=[(name, name) for name in AUDIENCES])
+    channels = forms.MultipleChoiceField(choices=[(channel, channel) for channel in CHANNELS],
+                                         initial=list(CHANNELS),
+                                         widget=forms.CheckboxSelectMultiple)
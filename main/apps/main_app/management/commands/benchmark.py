@@ -0,0 +1,140 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from loguru import logger
+from ... import benchmark, concurrency
+from ...fake_providers import provider_settings, running_providers
+import json
+import os
+import tempfile
+
+SCENARIOS = ('send', 'views', 'async', 'bulk', 'workers', 'concurrency')
+
+
+class Command(BaseCommand):
+    '''
+    ЗАМЕР производительности отправки уведомлений.
+    Поднимает локальные заглушки SMTP, Twilio и Telegram, создаёт отдельную тестовую БД
+    и прогоняет сценарии: send_notification, представления, асинхронное представление,
+    массовую рассылку с воркером, ту же рассылку пулом из 1, 2, 4... процессов-воркеров, одновременную запись в SQLite из процессов веба и бота.
+    Печатает пропускную способность, перцентили задержки и число SQL-запросов на операцию.
+    '''
+    help = 'Benchmark the notification pipeline against local fake providers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                            help='Какие сценарии запускать')
+        parser.add_argument('--iterations', type=int, default=200,
+                            help='Вызовов в сценариях send, views и async')
+        parser.add_argument('--users', type=int, default=1000, help='Получателей массовой рассылки')
+        parser.add_argument('--batch-size', type=int, default=100, help='Размер пачки воркера')
+        parser.add_argument('--latency', type=float, default=0.02,
+                            help='Задержка ответа заглушек, секунд')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Доля ответов заглушек с ошибкой (0..1)')
+        parser.add_argument('--seed', type=int, default=None, help='Зерно генератора ошибок')
+        parser.add_argument('--writers', type=int, default=2,
+                            help='Процессов веба и столько же процессов бота в сценарии concurrency')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Наибольший пул процессов-воркеров в сценарии workers')
+        parser.add_argument('--telegram-rate', type=int, default=1000,
+                            help='TELEGRAM_GLOBAL_RATE на время замера (сообщений в секунду)')
+        parser.add_argument('--json', dest='json_path', help='Сохранить результаты в JSON-файл')
+        parser.add_argument('--baseline', help='JSON-файл прошлого замера для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимое падение пропускной способности относительно baseline')
+
+    def handle(self, *args, **options):
+        if min(options['iterations'], options['users'], options['batch_size'], options['writers'],
+               options['workers']) < 1:
+            raise CommandError('--iterations, --users, --batch-size, --writers и --workers должны быть больше нуля')
+        with tempfile.TemporaryDirectory() as tmp:
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                results = self.run_scenarios(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.report(results)
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump({'options': {key: options[key] for key in ('iterations', 'users', 'batch_size',
+                                                                     'latency', 'error_rate')},
+                           'results': results}, f, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def run_scenarios(self, options):
+        results = []
+        with running_providers(options['latency'], options['error_rate'], options['seed']) as providers, \
+                override_settings(ALLOWED_HOSTS=['testserver'], TELEGRAM_GLOBAL_RATE=options['telegram_rate'],
+                                  **provider_settings(providers)):
+            benchmark.reset_transports()
+            logger.disable('apps.main_app')  # ошибки заглушек учитываются в отчёте, а не в логе
+            try:
+                users = benchmark.make_users('bench', options['iterations'])
+                if 'send' in options['scenarios']:
+                    results.append(benchmark.run_send(users))
+                    benchmark.clear_notifications()
+                if 'views' in options['scenarios']:
+                    results.append(benchmark.run_view(users[0], 'main_app:send_notification',
+                                                      options['iterations']))
+                    benchmark.clear_notifications()
+                if 'async' in options['scenarios']:
+                    results.append(benchmark.run_async_view(users[0], 'main_app:async_send_notification',
+                                                            options['iterations']))
+                    benchmark.clear_notifications()
+                if 'bulk' in options['scenarios']:
+                    benchmark.make_users('bulk', options['users'])
+                    results.append(benchmark.run_bulk(benchmark.User.objects.filter(username__startswith='bulk'),
+                                                      options['batch_size']))
+                if 'workers' in options['scenarios']:
+                    results += self.run_workers(options, provider_settings(providers))
+                if 'concurrency' in options['scenarios'] and connection.vendor == 'sqlite':
+                    results += concurrency.run_concurrency(options['writers'], options['iterations'])
+            finally:
+                logger.enable('apps.main_app')
+                benchmark.reset_transports()
+        return results
+
+    def run_workers(self, options, overrides):
+        ''' Рассылка пулом из 1, 2, 4... и --workers процессов: пропускная способность должна расти почти линейно до --telegram-rate. '''
+        users = benchmark.User.objects.filter(username__startswith='bulk')
+        if not users.exists():
+            benchmark.make_users('bulk', options['users'])
+        overrides = {**overrides, 'TELEGRAM_GLOBAL_RATE': options['telegram_rate']}
+        most = options['workers']
+        results = []
+        for workers in [1 << i for i in range(most.bit_length()) if 1 << i < most] + [most]:
+            benchmark.clear_notifications()
+            results.append(benchmark.run_workers(users, options['batch_size'], workers, overrides))
+        benchmark.clear_notifications()
+        return results
+
+    def report(self, results):
+        self.stdout.write(f"{'сценарий':<36}{'оп.':>7}{'оп./с':>10}{'p50 мс':>9}{'p95 мс':>9}"
+                          f"{'p99 мс':>9}{'SQL/оп.':>9}{'ошибки':>8}")
+        for result in results:
+            self.stdout.write(f"{result['scenario']:<36}{result['ops']:>7}{result['ops_per_sec']:>10.1f}"
+                              f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                              f"{result['queries_per_op']:>9.1f}{result['errors']:>8}")
+
+    def compare(self, results, baseline_path, tolerance):
+        ''' Сравнение с прошлым замером: рост числа запросов или падение скорости — регрессия. '''
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = {result['scenario']: result for result in json.load(f)['results']}
+        regressions = []
+        for result in results:
+            before = baseline.get(result['scenario'])
+            if before is None:
+                continue
+            if result['queries_per_op'] > before['queries_per_op'] + 0.01:
+                regressions.append(f"{result['scenario']}: SQL/оп. {before['queries_per_op']:.1f} "
+                                   f"-> {result['queries_per_op']:.1f}")
+            if result['ops_per_sec'] < before['ops_per_sec'] * (1 - tolerance):
+                regressions.append(f"{result['scenario']}: оп./с {before['ops_per_sec']:.1f} "
+                                   f"-> {result['ops_per_sec']:.1f}")
+        if regressions:
+            raise CommandError('Регрессия производительности:\n' + '\n'.join(regressions))
+        self.stdout.write('Регрессий относительно baseline нет.')
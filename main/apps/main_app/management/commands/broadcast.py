@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...broadcast import AUDIENCES, BROADCAST_BATCH_SIZE, broadcast, get_audience
+from ...notifications import CHANNELS
+
+
+class Command(BaseCommand):
+    ''' МАССОВАЯ РАССЫЛКА: ставит сообщение в очередь для выбранной аудитории. '''
+    help = 'Broadcast a message to many users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('message', help='Текст сообщения')
+        parser.add_argument('--audience', choices=list(AUDIENCES), default='all',
+                            help='Кому отправить рассылку')
+        parser.add_argument('--channels', nargs='+', choices=CHANNELS, default=list(CHANNELS),
+                            help='Каналы доставки')
+        parser.add_argument('--batch-size', type=int, default=BROADCAST_BATCH_SIZE,
+                            help='Размер пачки для bulk_create')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        total = broadcast(get_audience(options['audience']), options['message'],
+                          channels=options['channels'], batch_size=options['batch_size'])
+        self.stdout.write(f'В очереди {total} уведомлений.')
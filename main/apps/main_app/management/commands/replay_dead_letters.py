@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from ...models import Delivery
+from ...notifications import CHANNELS, replay_dead
+
+
+class Command(BaseCommand):
+    ''' ПОВТОРНАЯ ОТПРАВКА уведомлений из dead-letter. '''
+    help = 'Requeue notifications that ran out of delivery attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--channels', nargs='+', choices=CHANNELS, default=list(CHANNELS),
+                            help='Какие каналы вернуть в очередь')
+        parser.add_argument('--user', type=int, help='Только уведомления этого пользователя (id)')
+
+    def handle(self, *args, **options):
+        deliveries = Delivery.objects.dead().filter(channel__in=options['channels'])
+        if options['user']:
+            deliveries = deliveries.filter(notification__user_id=options['user'])
+        replayed = replay_dead(deliveries)
+        self.stdout.write(f'Возвращено в очередь: {replayed}.')
@@ -1,42 +1,47 @@
-from django.core.management.base import BaseCommand
-from dotenv import load_dotenv, find_dotenv
-from ....users_app.models import User
-import telebot
-import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from ...bot import get_bot
+from ... import metrics
+import asyncio
 from loguru import logger
 
-load_dotenv(find_dotenv())
-bot = telebot.TeleBot(os.getenv('TELEGRAM_BOT_TOKEN'))
-
 
 class Command(BaseCommand):
-    ''' ЗАПУСК БОТА через infinity_polling. '''
+    ''' ЗАПУСК БОТА: регистрация webhook или infinity_polling (--polling). '''
     help = 'Run your Telegram-bot'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--polling', action='store_true',
+                            help='Получать обновления через infinity_polling вместо webhook')
+        parser.add_argument('--async', action='store_true', dest='use_async',
+                            help='Запустить асинхронного бота (AsyncTeleBot) в режиме polling')
+        parser.add_argument('--metrics-port', type=int, default=settings.METRICS_BOT_PORT,
+                            help='Порт метрик Prometheus в режимах polling (0 — выключить)')
+
     def handle(self, *args, **options):
-        logger.info(f'\nБОТ запущен.')
-        bot.infinity_polling()  # запуск бота
-        logger.info(f'\nБОТ выключен.')
+        bot = get_bot()
+        if options['use_async'] or options['polling']:
+            metrics.start_exporter(options['metrics_port'])
+
+        if options['use_async']:
+            from ...async_bot import run_polling  # aiohttp и AsyncTeleBot нужны только этому режиму
+            logger.info(f'\nАСИНХРОННЫЙ БОТ запущен.')
+            bot.remove_webhook()
+            asyncio.run(run_polling())
+            logger.info(f'\nАСИНХРОННЫЙ БОТ выключен.')
+            return
 
+        if options['polling']:
+            bot.remove_webhook()
+            # Без цикла запросов Django соединение с базой проверяется перед каждой пачкой сообщений
+            bot.set_update_listener(lambda messages: close_old_connections())
+            logger.info(f'\nБОТ запущен.')
+            bot.infinity_polling()  # запуск бота
+            logger.info(f'\nБОТ выключен.')
+            return
 
-@bot.message_handler(commands=['start'])
-def start(message):
-    ''' АВТОРИЗАЦИЯ ЧЕРЕЗ ТЕЛЕГРАМ БОТа. '''
-    telegram_id = message.chat.id
-    token = message.text.split()[1] if len(message.text.split()) > 1 else None
-    if token is not None:
-        try:
-            user = User.objects.update_or_create(telegram_id=telegram_id, defaults={
-                'username': message.from_user.username,
-                'token': token, })
-            markup = telebot.types.InlineKeyboardMarkup()
-            markup.add(telebot.types.InlineKeyboardButton("перейти на сайт",
-                                                          url=f'http://{os.getenv("DOMAIN")}/users_app/login/'))
-            bot.send_message(message.chat.id, f"Вход выполнен успешно", reply_markup=markup)
-        except Exception as e:
-            logger.error(f'\nОшибка при обработке сообщения: {e}')
-            bot.send_message(chat_id=telegram_id,
-                             text="Произошла ошибка при попытке входа. Попробуйте еще раз.")
-    else:
-        bot.send_message(chat_id=telegram_id,
-                         text="Для того, что-бы войти в аккаунт перейдите по ссылке на сайте")
+        if not settings.TELEGRAM_WEBHOOK_URL or not settings.TELEGRAM_WEBHOOK_SECRET:
+            raise CommandError('Укажите TELEGRAM_WEBHOOK_URL и TELEGRAM_WEBHOOK_SECRET или запустите с --polling')
+        bot.set_webhook(url=settings.TELEGRAM_WEBHOOK_URL, secret_token=settings.TELEGRAM_WEBHOOK_SECRET)
+        logger.info(f'\nWEBHOOK БОТА установлен: {settings.TELEGRAM_WEBHOOK_URL}')
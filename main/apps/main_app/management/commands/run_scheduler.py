@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from ...scheduler import Scheduler
+from loguru import logger
+
+
+class Command(BaseCommand):
+    ''' ЗАПУСК ПЛАНИРОВЩИКА: постановка в очередь запланированных уведомлений в их срок. '''
+    help = 'Enqueue scheduled notifications when they become due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько наступивших записей забирать одной транзакцией')
+        parser.add_argument('--once', action='store_true',
+                            help='Поставить в очередь наступившие записи и выйти')
+
+    def handle(self, *args, **options):
+        scheduler = Scheduler(batch_size=options['batch_size'])
+        if options['once']:
+            scheduler.tick()
+            return
+        logger.info(f'\nПЛАНИРОВЩИК запущен.')
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
+        logger.info(f'\nПЛАНИРОВЩИК выключен.')
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ...notifications import batch_time, claim_batch, deliver_batch
+from ...transports import telegram
+from ... import metrics
+from ...workers import run_pool, worker_name
+from ....users_app.login_tokens import purge_expired
+from loguru import logger
+import time
+
+
+class Command(BaseCommand):
+    '''
+    ЗАПУСК ВОРКЕРА: отправка уведомлений из очереди (outbox).
+    Воркеров может быть несколько на узле (--workers) и на разных узлах: пачки забираются с арендой
+    на --lease секунд, доставки упавшего воркера после её истечения забирают остальные.
+    С --partitions очередь делится по user_id, и доставки пользователя обрабатывает один воркер.
+    Лимиты Telegram считает каждый процесс: воркеры пула делят TELEGRAM_GLOBAL_RATE узла поровну
+    и всегда работают с партициями, чтобы сообщения в один чат отправлял один воркер.
+    '''
+    help = 'Deliver pending notifications'
+    worker = None  # имя воркера в locked_by, задаётся в work()
+    lease = None
+    partitions = ()
+    partition_count = 0
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Сколько доставок забирать за один проход')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза в секундах, если очередь пуста')
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать очередь один раз и выйти')
+        parser.add_argument('--metrics-port', type=int, default=settings.METRICS_WORKER_PORT,
+                            help='Порт метрик Prometheus (0 — выключить), у воркеров пула — порт + номер')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Процессов-воркеров на этом узле; делят TELEGRAM_GLOBAL_RATE поровну, '
+                                 'без --partitions очередь делится между ними по user_id')
+        parser.add_argument('--lease', type=float, default=settings.NOTIFICATION_LEASE_TIMEOUT,
+                            help='На сколько секунд воркер забирает пачку доставок '
+                                 '(не меньше худшего времени отправки пачки --batch-size)')
+        parser.add_argument('--partitions', type=int, default=0,
+                            help='На сколько партиций по user_id делить очередь (0 — без партиций)')
+        parser.add_argument('--partition', type=int, nargs='+',
+                            help='Партиции этого узла, по умолчанию все')
+
+    def handle(self, *args, **options):
+        workers, partition_count = options['workers'], options['partitions']
+        partitions = options['partition'] or list(range(partition_count))
+        if workers < 1 or options['lease'] <= 0 or partition_count < 0:
+            raise CommandError('--workers и --lease должны быть больше нуля, --partitions не меньше нуля')
+        if partition_count and not all(0 <= partition < partition_count for partition in partitions):
+            raise CommandError(f'--partition должны быть от 0 до {partition_count - 1}')
+        if partition_count and len(partitions) < workers:
+            raise CommandError('Партиций узла меньше, чем воркеров: лишние воркеры простаивали бы')
+        lease = max(options['lease'], batch_time(options['batch_size']))
+        if lease > options['lease']:
+            logger.warning(f"\nАРЕНДА {options['lease']:g} сек. короче худшего времени пачки, используется {lease:g} сек.")
+        work_options = {'batch_size': options['batch_size'], 'interval': options['interval'],
+                        'once': options['once'], 'metrics_port': options['metrics_port'],
+                        'lease': lease, 'partition_count': partition_count}
+        if workers > 1:
+            run_pool(workers, partitions, **work_options)
+        else:
+            self.work(partitions=partitions, **work_options)
+
+    def work(self, batch_size, interval=1.0, once=False, metrics_port=0, lease=None,
+             partitions=(), partition_count=0, index=0):
+        '''
+        Цикл воркера: забирает пачки доставок и отправляет их, пока очередь не пуста.
+
+        :param partitions: Партиции по user_id этого воркера (при partition_count).
+        :param index: Номер воркера в пуле (для порта метрик).
+        '''
+        self.worker, self.lease = worker_name(), lease
+        self.partitions, self.partition_count = list(partitions), partition_count
+        if not once:
+            metrics.start_exporter(metrics_port + index if metrics_port else 0)
+        logger.info(f'\nВОРКЕР уведомлений {self.worker} запущен'
+                    + (f', партиции {self.partitions} из {partition_count}.' if partition_count else '.'))
+        purged_at = 0.0
+        try:
+            while True:
+                if time.monotonic() - purged_at >= settings.LOGIN_TOKEN_PURGE_INTERVAL:
+                    self.purge_login_tokens()
+                    purged_at = time.monotonic()
+                processed = self.process_batch(batch_size)
+                if once and not processed:
+                    break
+                if not processed:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        logger.info(f'\nВОРКЕР уведомлений {self.worker} выключен.')
+
+    def process_batch(self, batch_size):
+        ''' Забирает пачку доставок из очереди с арендой и отправляет их. '''
+        batch = claim_batch(self.worker or worker_name(), batch_size, self.lease,
+                            self.partitions, self.partition_count)
+        if batch:
+            deliver_batch(batch)
+            stats = telegram.scheduler_stats()
+            if stats.get('throughput'):
+                logger.info(f"\nTELEGRAM: {stats['throughput']:.1f} сообщ./сек, в ожидании {stats['waiting']}.")
+        return len(batch)
+
+    def purge_login_tokens(self):
+        ''' Фоновая очистка просроченных токенов входа через телеграм. '''
+        purged = purge_expired()
+        if purged:
+            logger.info(f'\nУДАЛЕНО просроченных токенов входа: {purged}.')
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.db.models import Count
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+                               start_http_server)
+from prometheus_client.core import GaugeMetricFamily
+from .models import Delivery, DeliveryStatus
+from loguru import logger
+import os
+import threading
+import time
+
+# Задержки провайдеров: от десятков миллисекунд (Telegram) до секунд (SMTP-пачки).
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))  # несколько процессов пишут метрики в общий каталог
+
+SEND_SECONDS = Histogram('notification_send_seconds',
+                         'Время отправки пачки по каналу (для СМС и Telegram — одного сообщения)',
+                         ['channel'], buckets=LATENCY_BUCKETS)
+SEND_TOTAL = Counter('notification_send_total',
+                     'Попытки отправки по каналу: result=ok или класс ошибки',
+                     ['channel', 'result'])
+BOT_START_SECONDS = Histogram('bot_start_seconds', 'Время обработки /start ботом',
+                              ['bot'], buckets=LATENCY_BUCKETS)
+BOT_START_TOTAL = Counter('bot_start_total', 'Обработанные /start: result=login, no_token или error',
+                          ['bot', 'result'])
+
+
+def record_send(channel, error=None):
+    ''' Учёт результата одной доставки. '''
+    SEND_TOTAL.labels(channel, 'ok' if error is None else type(error).__name__).inc()
+
+
+class QueueDepthCollector:
+    '''
+    Глубина очереди: доставки "в очереди" и в dead-letter по каналам.
+    Результат запроса держится METRICS_QUEUE_DEPTH_TTL секунд, чтобы частые опросы
+    не гоняли GROUP BY по таблице доставок.
+    '''
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._rows = None
+        self._expires_at = 0.0
+
+    def rows(self):
+        with self._lock:
+            now = self.clock()
+            if self._rows is None or now >= self._expires_at:
+                self._rows = list(Delivery.objects.filter(status__in=[DeliveryStatus.PENDING, DeliveryStatus.DEAD])
+                                  .values_list('channel', 'status').annotate(total=Count('id')).order_by())
+                self._expires_at = now + settings.METRICS_QUEUE_DEPTH_TTL
+            return self._rows
+
+    def reset(self):
+        with self._lock:
+            self._rows = None
+
+    def collect(self):
+        gauge = GaugeMetricFamily('notification_queue_depth', 'Доставок в очереди и в dead-letter',
+                                  labels=['channel', 'status'])
+        for channel, status, total in self.rows():
+            gauge.add_metric([channel, status], total)
+        yield gauge
+
+
+queue_depth = QueueDepthCollector()
+queue_registry = CollectorRegistry()
+queue_registry.register(queue_depth)
+
+
+def render():
+    '''
+    Метрики в текстовом формате Prometheus.
+    Если задан PROMETHEUS_MULTIPROC_DIR (несколько воркеров uvicorn/gunicorn),
+    метрики собираются со всех процессов.
+    '''
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry) + generate_latest(queue_registry)
+
+
+def start_exporter(port):
+    ''' Отдельный HTTP-сервер метрик для процессов без Django-представлений (бот, воркер). '''
+    if port:
+        start_http_server(port)
+        logger.info(f'\nМЕТРИКИ доступны на порту {port}: /metrics')
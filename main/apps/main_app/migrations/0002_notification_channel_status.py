@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+
+def sent_flags_to_status(apps, schema_editor):
+    """ Перенос старых булевых флагов отправки в статусы каналов. """
+    Notification = apps.get_model('main_app', 'Notification')
+    for channel in ('email', 'sms', 'telegram'):
+        Notification.objects.filter(**{f'{channel}_sent': True}).update(**{f'{channel}_status': 'sent'})
+        Notification.objects.filter(**{f'{channel}_sent': False}).update(**{f'{channel}_status': 'failed'})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='email_status',
+            field=models.CharField(choices=[('skipped', 'Не запрошено'), ('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='skipped', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sms_status',
+            field=models.CharField(choices=[('skipped', 'Не запрошено'), ('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='skipped', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='telegram_status',
+            field=models.CharField(choices=[('skipped', 'Не запрошено'), ('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='skipped', max_length=16),
+        ),
+        migrations.RunPython(sent_flags_to_status, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notification',
+            name='email_sent',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='sms_sent',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='telegram_sent',
+        ),
+    ]
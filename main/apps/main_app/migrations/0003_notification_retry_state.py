@@ -0,0 +1,63 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0002_notification_channel_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='email_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='email_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sms_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sms_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='telegram_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='telegram_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='email_status',
+            field=models.CharField(choices=[('skipped', 'Не запрошено'), ('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Ошибка'), ('dead', 'Не доставлено')], default='skipped', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='sms_status',
+            field=models.CharField(choices=[('skipped', 'Не запрошено'), ('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Ошибка'), ('dead', 'Не доставлено')], default='skipped', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='telegram_status',
+            field=models.CharField(choices=[('skipped', 'Не запрошено'), ('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Ошибка'), ('dead', 'Не доставлено')], default='skipped', max_length=16),
+        ),
+    ]
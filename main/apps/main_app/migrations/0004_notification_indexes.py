@@ -0,0 +1,29 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0003_notification_retry_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-date_add', '-id'], name='notification_user_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('email_status', 'pending')), fields=['next_attempt_at'], name='notification_email_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('sms_status', 'pending')), fields=['next_attempt_at'], name='notification_sms_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('telegram_status', 'pending')), fields=['next_attempt_at'], name='notification_tg_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,128 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import hashlib
+
+CHANNELS = ('email', 'sms', 'telegram')
+BATCH_SIZE = 1000
+
+
+def split_notifications(apps, schema_editor):
+    """
+    Перенос текста в таблицу сообщений (один раз на одинаковый текст)
+    и статусов каналов в отдельные записи доставки.
+    Уведомления обрабатываются пачками: на пачку один bulk_create сообщений,
+    один bulk_update уведомлений и один bulk_create доставок.
+    """
+    Notification = apps.get_model('main_app', 'Notification')
+    messages = {}  # sha256 текста -> Message
+    batch = []
+    for notification in Notification.objects.order_by('id').iterator(chunk_size=BATCH_SIZE):
+        batch.append(notification)
+        if len(batch) >= BATCH_SIZE:
+            _split_batch(apps, batch, messages)
+            batch = []
+    if batch:
+        _split_batch(apps, batch, messages)
+
+
+def _split_batch(apps, batch, messages):
+    Notification = apps.get_model('main_app', 'Notification')
+    Message = apps.get_model('main_app', 'Message')
+    Delivery = apps.get_model('main_app', 'Delivery')
+    hashes = [hashlib.sha256(notification.message.encode()).hexdigest() for notification in batch]
+    new = {body_hash: notification.message for body_hash, notification in zip(hashes, batch)
+           if body_hash not in messages}
+    if new:
+        Message.objects.bulk_create([Message(body_hash=body_hash, body=body) for body_hash, body in new.items()])
+        messages.update(Message.objects.filter(body_hash__in=new).in_bulk(field_name='body_hash'))
+    for body_hash, notification in zip(hashes, batch):
+        notification.message_ref = messages[body_hash]
+    Notification.objects.bulk_update(batch, ['message_ref'])
+    Delivery.objects.bulk_create([
+        Delivery(notification=notification, channel=channel,
+                 status=getattr(notification, f'{channel}_status'),
+                 attempts=getattr(notification, f'{channel}_attempts'),
+                 last_error=getattr(notification, f'{channel}_error'),
+                 next_attempt_at=notification.next_attempt_at)
+        for notification in batch
+        for channel in CHANNELS if getattr(notification, f'{channel}_status') != 'skipped'
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Message',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('body', models.TextField()),
+                ('body_hash', models.CharField(max_length=64, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=16)),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Ошибка'), ('dead', 'Не доставлено')], default='pending', max_length=8)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('provider_message_id', models.CharField(blank=True, max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='main_app.notification')),
+            ],
+            options={
+                'verbose_name_plural': 'Deliveries',
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='message_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='main_app.message'),
+        ),
+        migrations.RunPython(split_notifications, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_email_pending_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_sms_pending_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_tg_pending_idx',
+        ),
+        migrations.RemoveField(model_name='notification', name='email_status'),
+        migrations.RemoveField(model_name='notification', name='sms_status'),
+        migrations.RemoveField(model_name='notification', name='telegram_status'),
+        migrations.RemoveField(model_name='notification', name='email_attempts'),
+        migrations.RemoveField(model_name='notification', name='sms_attempts'),
+        migrations.RemoveField(model_name='notification', name='telegram_attempts'),
+        migrations.RemoveField(model_name='notification', name='email_error'),
+        migrations.RemoveField(model_name='notification', name='sms_error'),
+        migrations.RemoveField(model_name='notification', name='telegram_error'),
+        migrations.RemoveField(model_name='notification', name='next_attempt_at'),
+        migrations.RemoveField(model_name='notification', name='message'),
+        migrations.RenameField(model_name='notification', old_name='message_ref', new_name='message'),
+        migrations.AlterField(
+            model_name='notification',
+            name='message',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='main_app.message'),
+        ),
+        migrations.AddConstraint(
+            model_name='delivery',
+            constraint=models.UniqueConstraint(fields=('notification', 'channel'), name='delivery_notification_channel_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='delivery_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from datetime import timezone as dt_timezone
+from django.conf import settings
+from django.db import migrations
+import zoneinfo
+
+# Поля, которые при USE_TZ = False сохранялись в SQLite как местное время TIME_ZONE без пояса.
+DATETIME_FIELDS = [
+    ('main_app', 'Notification', ['date_add']),
+    ('main_app', 'Delivery', ['next_attempt_at', 'sent_at', 'updated_at']),
+    ('users_app', 'User', ['last_login', 'date_joined', 'token_expires_at']),
+]
+
+
+def _convert(apps, schema_editor, forward):
+    """
+    Перевод сохранённого времени в UTC (forward) и обратно.
+    PostgreSQL хранит timestamptz с поясом соединения, там значения уже верные.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    local = zoneinfo.ZoneInfo(settings.TIME_ZONE)
+    for app_label, model_name, fields in DATETIME_FIELDS:
+        Model = apps.get_model(app_label, model_name)
+        batch = []
+        for obj in Model.objects.only(*fields).iterator(chunk_size=1000):
+            for field in fields:
+                value = getattr(obj, field)
+                if value is None:
+                    continue
+                # Django читает время из SQLite как UTC; на деле до перехода это местное время, и наоборот.
+                if forward:
+                    value = value.replace(tzinfo=local).astimezone(dt_timezone.utc)
+                else:
+                    value = value.astimezone(local).replace(tzinfo=dt_timezone.utc)
+                setattr(obj, field, value)
+            batch.append(obj)
+            if len(batch) >= 1000:
+                Model.objects.bulk_update(batch, fields)
+                batch = []
+        if batch:
+            Model.objects.bulk_update(batch, fields)
+
+
+def to_utc(apps, schema_editor):
+    _convert(apps, schema_editor, forward=True)
+
+
+def to_local(apps, schema_editor):
+    _convert(apps, schema_editor, forward=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0006_notification_idempotency_key'),
+        ('users_app', '0002_login_token_expiry'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_utc, to_local),
+    ]
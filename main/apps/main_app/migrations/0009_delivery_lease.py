@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_schedulednotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='locked_by',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
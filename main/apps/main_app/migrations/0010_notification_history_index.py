@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_delivery_lease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['-date_add', '-id'], name='notification_history_idx'),
+        ),
+    ]
@@ -1,17 +1,152 @@
 from django.db import models
+from django.db.models.functions import Mod
 from ..users_app.models import User
+import hashlib
+
+
+class DeliveryStatus(models.TextChoices):
+    """ Статус доставки уведомления по отдельному каналу. """
+    PENDING = 'pending', 'В очереди'
+    SENT = 'sent', 'Отправлено'
+    FAILED = 'failed', 'Ошибка'  # постоянная ошибка, повторять бесполезно
+    DEAD = 'dead', 'Не доставлено'  # исчерпаны попытки (dead-letter)
+
+
+class Message(models.Model):
+    """
+    Класс СООБЩЕНИЕ.
+    Текст хранится один раз и переиспользуется всеми уведомлениями
+    с таким же текстом (например, всеми уведомлениями рассылки).
+    """
+    body = models.TextField()
+    body_hash = models.CharField(max_length=64, unique=True)  # sha256 текста
+
+    @staticmethod
+    def hash_body(body):
+        return hashlib.sha256(body.encode()).hexdigest()
+
+    @classmethod
+    def for_body(cls, body):
+        """ Возвращает сообщение с таким текстом, создавая его при необходимости. """
+        message, _ = cls.objects.get_or_create(body_hash=cls.hash_body(body), defaults={'body': body})
+        return message
+
+    def __str__(self):
+        return self.body[:50]
 
 
 class Notification(models.Model):
     """
     Класс УВЕДОМЛЕНИЕ.
-    Состоит из: пользователя получателя, сообщения,
-    статусов отправки: емейл, смс и телеграм,
-    и даты добавления.
+    Состоит из: пользователя получателя, сообщения и даты добавления.
+    Статусы отправки по каналам хранятся в Delivery.
+    Ключ идемпотентности не даёт повторному запросу создать и отправить уведомление ещё раз.
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    message = models.TextField()
-    email_sent = models.BooleanField(default=False)  # статус отправки емейл
-    sms_sent = models.BooleanField(default=False)  # статус отправки смс
-    telegram_sent = models.BooleanField(default=False)  # статус отправки телеграм
+    message = models.ForeignKey(Message, on_delete=models.PROTECT)
     date_add = models.DateTimeField(auto_now_add=True)
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)  # sha256, см. enqueue_once
+
+    class Meta:
+        indexes = [
+            # История уведомлений пользователя (keyset-пагинация по дате и id).
+            models.Index(fields=['user', '-date_add', '-id'], name='notification_user_history_idx'),
+            # Вся история для staff (/api/notifications без фильтра по пользователю).
+            models.Index(fields=['-date_add', '-id'], name='notification_history_idx'),
+        ]
+
+    def delivery_map(self):
+        """ Доставки по каналам: {канал: Delivery}. Использует prefetch_related('deliveries'). """
+        return {delivery.channel: delivery for delivery in self.deliveries.all()}
+
+
+class DeliveryQuerySet(models.QuerySet):
+
+    def pending(self):
+        """ Доставки, ожидающие отправки. """
+        return self.filter(status=DeliveryStatus.PENDING)
+
+    def due(self, now):
+        """ Доставки в очереди, время следующей попытки которых наступило. """
+        return self.pending().filter(models.Q(next_attempt_at__isnull=True)
+                                     | models.Q(next_attempt_at__lte=now))
+
+    def unleased(self, now):
+        """ Доставки, которые не держит воркер (или его аренда истекла). """
+        return self.filter(models.Q(locked_until__isnull=True) | models.Q(locked_until__lte=now))
+
+    def claimable(self, now):
+        """ Доставки, которые может забрать воркер: срок наступил и их не держит другой воркер (или его аренда истекла). """
+        return self.due(now).unleased(now)
+
+    def in_partitions(self, partitions, count):
+        """ Доставки пользователей из партиций: партиция — остаток user_id от деления на count. """
+        return self.alias(partition=Mod('notification__user_id', count)).filter(partition__in=partitions)
+
+    def dead(self):
+        """ Доставки, исчерпавшие попытки (dead-letter). """
+        return self.filter(status=DeliveryStatus.DEAD)
+
+
+class Delivery(models.Model):
+    """
+    Класс ДОСТАВКА.
+    Одна узкая запись на пару (уведомление, канал): статус, число попыток,
+    последняя ошибка, время следующей попытки, время отправки
+    и id сообщения у провайдера.
+    Воркер, забравший доставку, держит её до locked_until (аренда): если он упал,
+    после истечения аренды доставку заберёт другой воркер.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='deliveries')
+    channel = models.CharField(max_length=16)
+    status = models.CharField(max_length=8, choices=DeliveryStatus.choices, default=DeliveryStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)  # время повторной попытки
+    sent_at = models.DateTimeField(null=True, blank=True)
+    provider_message_id = models.CharField(max_length=64, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    locked_until = models.DateTimeField(null=True, blank=True)  # до какого времени доставку держит воркер
+    locked_by = models.CharField(max_length=64, blank=True)  # какой воркер (узел:pid)
+
+    objects = DeliveryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'Deliveries'
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'channel'], name='delivery_notification_channel_uniq'),
+        ]
+        indexes = [
+            # Частичный индекс только по доставкам в очереди.
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status='pending'),
+                         name='delivery_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.notification_id}:{self.channel} ({self.status})'
+
+
+class ScheduledNotificationQuerySet(models.QuerySet):
+
+    def due(self, now):
+        """ Записи, срок которых наступил. """
+        return self.filter(due_at__lte=now)
+
+
+class ScheduledNotification(models.Model):
+    """
+    Класс ЗАПЛАНИРОВАННОЕ УВЕДОМЛЕНИЕ.
+    В момент due_at планировщик `run_scheduler` ставит уведомление в очередь.
+    Если задан interval (регулярная сводка), запись переносится на следующий срок, иначе удаляется.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    message = models.ForeignKey(Message, on_delete=models.PROTECT)
+    channels = models.JSONField(default=list)  # каналы доставки, как в enqueue_notification
+    due_at = models.DateTimeField(db_index=True)  # планировщик читает записи диапазоном по этому индексу
+    interval = models.DurationField(null=True, blank=True)  # период повторения
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ScheduledNotificationQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.user_id}: {self.message} ({self.due_at:%Y-%m-%d %H:%M})'
@@ -1,94 +1,366 @@
-from django.core.mail import send_mail
-from twilio.rest import Client as TwilioClient
-from .management.commands.run_bot import bot
-from .models import Notification
-from dotenv import load_dotenv
-import os
+from asgiref.sync import sync_to_async
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from .backends import get_backend
+from .backends.base import DeliveryTimeout, PermanentDeliveryError
+from . import metrics
+from .models import Delivery, DeliveryStatus, Message, Notification
+from ..users_app.models import User
+from .workers import worker_name
 from loguru import logger
+import asyncio
+import hashlib
+import random
+import time
 
-load_dotenv()
-
-
-def send_all_notification(user, message):
-    '''Отправка уведомления: EMAIL, SMS, TELEGRAM. '''
-    # Создаем уведомление
-    notification = Notification.objects.create(user=user, message=message)  # Создаем уведомление
-    try:  # Попробовать отправить на Email
-        send_mail(
-            subject='Notification',
-            message=message,
-            from_email=None,
-            recipient_list=[user.email],
-        )
-        notification.email_sent = True  # смена статуса отправки
-        notification.save()
-    except Exception as e:
-        logger.error(f'\nНЕ ПОЛУЧИЛОСЬ ОТПРАВИТЬ EMAIL: {e}.')
-
-    try:  # Попробовать отправить по SMS
-        load_dotenv()
-        twilio_client = TwilioClient(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
-        twilio_client.messages.create(
-            body=message,
-            from_=os.getenv('TWILIO_PHONE_NUMBER'),
-            to=user.phone_number, )
-        notification.sms_sent = True  # смена статуса отправки
-        notification.save()
-    except Exception as e:
-        logger.error(f'\nНЕ ПОЛУЧИЛОСЬ ОТПРАВИТЬ СМС: {e}')
-
-    try:  # Попробовать отправить в Telegram
-        bot.send_message(chat_id=user.telegram_id, text=message)
-        notification.telegram_sent = True  # смена статуса отправки
-        notification.save()
-        return
-    except Exception as e:
-        logger.error(f'\nНЕ ПОЛУЧИЛОСЬ ОТПРАВИТЬ СООБЩЕНИЕ В ТЕЛЕГРАМ: {e}')
-
-
-def send_sms_notification(user, message):
-    '''Отправка уведомления по СМС. '''
-    notification = Notification.objects.create(user=user, message=message)  # Создаем уведомление
-    try:
-        load_dotenv()
-        twilio_client = TwilioClient(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
-        twilio_client.messages.create(
-            body=message,
-            from_=os.getenv('TWILIO_PHONE_NUMBER'),
-            to=user.phone_number, )
-        notification.sms_sent = True  # смена статуса отправки
-        notification.save()
-        return
-    except Exception as e:
-        logger.error(f'\nОШИБКА. НЕ ПОЛУЧИЛОСЬ ОТПРАВИТЬ СМС: {e}')
-
-
-def send_email_notification(user, message):
-    '''Отправка уведомления на EMAIL. '''
-    notification = Notification.objects.create(user=user, message=message)
-    try:
-        if user.email:
-            send_mail(
-                subject='Notification',
-                message=message,
-                from_email=None,
-                recipient_list=[user.email], )
-            notification.email_sent = True  # смена статуса отправки
-            notification.save()
-            return
-        else:
-            logger.error(f'\nУКАЖИТЕ СВОЙ EMAIL')
-    except Exception as e:
-        logger.error(f'\nНЕ ПОЛУЧИЛОСЬ ОТПРАВИТЬ EMAIL: {e}')
-
-
-def send_telegram_notification(user, message):
-    '''Отправка уведомления в TELEGRAM. '''
-    notification = Notification.objects.create(user=user, message=message)  # Создаем уведомление
+CHANNELS = tuple(settings.NOTIFICATION_CHANNELS)  # все настроенные каналы доставки
+DELIVERY_FIELDS = ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at',
+                   'provider_message_id', 'updated_at', 'locked_until', 'locked_by']
+
+# Общий пул потоков для параллельной отправки по каналам.
+fanout_executor = ThreadPoolExecutor(max_workers=settings.NOTIFICATION_FANOUT_WORKERS,
+                                     thread_name_prefix='notification-fanout')
+
+
+def channel_flag(channel):
+    '''
+    Флаг пользователя «канал доступен» (User.can_<канал>) или None, если у канала флага нет
+    и он доступен всем. Бэкенд канала не создаётся, поэтому постановка в очередь в веб-процессе
+    не загружает telebot и twilio.
+    '''
+    field = f'can_{channel}'
+    return field if any(f.name == field for f in User._meta.concrete_fields) else None
+
+
+def reachable_channels(user, channels=CHANNELS):
+    '''
+    Каналы, в которые пользователю можно отправить сообщение (флаги User.can_*):
+    канал без адреса не ставится в очередь, а не падает с ошибкой при отправке.
+    '''
+    return [channel for channel in channels if (flag := channel_flag(channel)) is None or getattr(user, flag)]
+
+
+def enqueue_notification(user, message, channels=CHANNELS, idempotency_key=None):
+    '''
+    Постановка уведомления в очередь (outbox).
+    Сохраняет уведомление и по одной доставке "в очереди" на каждый выбранный канал,
+    доступный пользователю, саму отправку выполняет воркер `send_notifications`.
+
+    :return: Уведомление или None, если ни один канал не доступен: тогда ничего не сохраняется,
+        и ключ идемпотентности не занимается до того, как пользователь укажет адрес.
+    '''
+    channels = reachable_channels(user, channels)
+    if not channels:
+        return None
+    notification = Notification.objects.create(user=user, message=Message.for_body(message),
+                                               idempotency_key=idempotency_key)
+    Delivery.objects.bulk_create([Delivery(notification=notification, channel=channel) for channel in channels])
+    return notification
+
+
+def idempotency_key(user, message, channels, key=None, now=None):
+    '''
+    Ключ идемпотентности уведомления.
+
+    :param key: Ключ клиента (заголовок Idempotency-Key), действует для этого пользователя.
+    :param now: Время запроса (time.time()), если ключа клиента нет: тогда одинаковые
+        пользователь, текст и каналы в пределах NOTIFICATION_IDEMPOTENCY_WINDOW секунд дают один ключ.
+    :return: sha256 в hex.
+    '''
+    if key:
+        raw = f'{user.pk}:key:{key}'
+    else:
+        window = int((time.time() if now is None else now) // settings.NOTIFICATION_IDEMPOTENCY_WINDOW)
+        raw = f'{user.pk}:{Message.hash_body(message)}:{",".join(sorted(channels))}:{window}'
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def enqueue_once(user, message, channels=CHANNELS, key=None):
+    '''
+    Постановка уведомления в очередь не больше одного раза на ключ идемпотентности.
+    Повтор запроса (обновление страницы, повтор прокси, двойной клик) получает уже созданное
+    уведомление; уникальный индекс по ключу не даёт одновременным повторам создать второе.
+
+    :param key: Ключ клиента, по умолчанию ключ выводится из пользователя, текста и окна времени.
+    :return: (уведомление с prefetch доставок, создано ли оно этим вызовом);
+        (None, False), если пользователю не доступен ни один из каналов.
+    '''
+    key = idempotency_key(user, message, channels, key)
+    existing = Notification.objects.prefetch_related('deliveries')
+    notification = existing.filter(idempotency_key=key).first()
+    if notification is not None:
+        return notification, False
     try:
-        bot.send_message(chat_id=user.telegram_id, text=message)
-        notification.telegram_sent = True  # смена статуса отправки
-        notification.save()
-        return
-    except Exception as e:
-        logger.error(f'\nСООБЩЕНИЕ В ТЕЛЕГРАМ НЕ ДОСТАВЛЕНО: {e}')
+        with transaction.atomic():
+            notification = enqueue_notification(user, message, channels, idempotency_key=key)
+            return notification, notification is not None
+    except IntegrityError:  # одновременный повтор успел создать уведомление первым
+        return existing.get(idempotency_key=key), False
+
+
+def is_permanent(channel, error):
+    ''' Постоянная ли ошибка для канала (решает бэкенд канала). '''
+    return isinstance(error, PermanentDeliveryError) or get_backend(channel).is_permanent(error)
+
+
+def retry_delay(attempts):
+    '''
+    Задержка перед следующей попыткой: экспоненциальный рост со случайным разбросом
+    в верхней половине интервала, чтобы повторы не приходили одновременно.
+
+    :param attempts: Сколько попыток уже сделано.
+    :return: timedelta до следующей попытки.
+    '''
+    ceiling = min(settings.NOTIFICATION_RETRY_MAX_DELAY,
+                  settings.NOTIFICATION_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return timedelta(seconds=random.uniform(ceiling / 2, ceiling))
+
+
+def batch_deadline(count):
+    '''
+    Сколько секунд ждать начала отправки пачки из count доставок: столько «волн» пула потоков,
+    сколько нужно на count сообщений, по NOTIFICATION_CHANNEL_TIMEOUT на волну.
+    '''
+    return settings.NOTIFICATION_CHANNEL_TIMEOUT * -(-count // settings.NOTIFICATION_FANOUT_WORKERS)
+
+
+def batch_time(count):
+    '''
+    Наибольшее время отправки пачки воркера из count доставок: ожидание начала (batch_deadline)
+    и самая длинная пачка бэкенда, каждое сообщение которой упёрлось в таймаут транспорта.
+    Аренда пачки должна быть не короче.
+    '''
+    longest = max(min(count, get_backend(channel).batch_size) for channel in CHANNELS)
+    return batch_deadline(count) + longest * settings.NOTIFICATION_CHANNEL_TIMEOUT
+
+
+def _dispatch(deliveries):
+    '''
+    Общий конвейер отправки для воркера, рассылки и представлений.
+    Доставки группируются по (канал, сообщение), группа делится на пачки
+    по batch_size бэкенда, пачки отправляются через backend.send_batch
+    параллельно в общем пуле потоков. Каждое сообщение ограничено таймаутом сокетов
+    транспорта (NOTIFICATION_CHANNEL_TIMEOUT), поэтому начатые пачки дожидаются
+    и сохраняют настоящий результат по каждому сообщению. Пачки, не начавшиеся
+    за batch_deadline, отменяются и возвращаются в очередь без учёта попытки.
+    Меняет доставки в памяти, но не сохраняет их.
+    '''
+    groups = defaultdict(list)
+    for delivery in deliveries:
+        groups[delivery.channel, delivery.notification.message_id].append(delivery)
+    futures = {}
+    for (channel, _), group in groups.items():
+        backend = get_backend(channel)
+        body = group[0].notification.message.body
+        for start in range(0, len(group), backend.batch_size):
+            chunk = group[start:start + backend.batch_size]
+            recipients = [delivery.notification.user for delivery in chunk]
+            futures[fanout_executor.submit(_send_batch, backend, recipients, body)] = chunk
+    _, not_done = wait(futures, timeout=batch_deadline(len(deliveries)))
+    for future in not_done:
+        if future.cancel():  # пачка не дождалась свободного потока и не отправлялась
+            chunk = futures.pop(future)
+            logger.warning(f'\nНЕ ДОЖДАЛИСЬ ПОТОКА {chunk[0].channel.upper()}: {len(chunk)} доставок вернутся в очередь.')
+            for delivery in chunk:
+                delivery.locked_until, delivery.locked_by = None, ''
+    wait(futures)  # начатые пачки ограничены таймаутами транспорта
+    results = []
+    for future, chunk in futures.items():
+        error = future.exception()
+        results += zip(chunk, [error] * len(chunk) if error else future.result())
+    _apply_results(results)
+
+
+def _send_batch(backend, recipients, message):
+    with metrics.SEND_SECONDS.labels(backend.channel).time():
+        return backend.send_batch(recipients, message)
+
+
+async def _asend(delivery):
+    backend = get_backend(delivery.channel)
+    with metrics.SEND_SECONDS.labels(backend.channel).time():
+        try:
+            return await asyncio.wait_for(backend.asend(delivery.notification.user, delivery.notification.message.body),
+                                          timeout=settings.NOTIFICATION_CHANNEL_TIMEOUT)
+        except TimeoutError as e:  # email в потоке to_thread продолжает отправку и после отмены
+            raise DeliveryTimeout('превышено время ожидания, отправка могла пройти') from e
+
+
+async def _adispatch(deliveries):
+    '''
+    Асинхронный вариант _dispatch для одного уведомления: каналы отправляются через asyncio.gather.
+    '''
+    outcomes = await asyncio.gather(*(_asend(delivery) for delivery in deliveries), return_exceptions=True)
+    _apply_results(list(zip(deliveries, outcomes)))
+
+
+def _apply_results(results):
+    '''
+    Применяет результаты отправки к доставкам.
+
+    :param results: Пары (доставка, id сообщения у провайдера или исключение).
+    '''
+    now = timezone.now()
+    for delivery, outcome in results:
+        delivery.attempts += 1
+        delivery.updated_at = now
+        if not isinstance(outcome, DeliveryTimeout):  # пока отправка может идти, аренда не снимается
+            delivery.locked_until, delivery.locked_by = None, ''  # аренда воркера снимается вместе со статусом
+        if isinstance(outcome, BaseException):
+            metrics.record_send(delivery.channel, outcome)
+            _record_failure(delivery, outcome, now)
+            continue
+        metrics.record_send(delivery.channel)
+        delivery.status = DeliveryStatus.SENT  # смена статуса отправки
+        delivery.sent_at = now
+        delivery.last_error = ''
+        delivery.next_attempt_at = None
+        delivery.provider_message_id = str(outcome or '')[:64]
+
+
+def _record_failure(delivery, error, now):
+    '''
+    Учёт неудачной попытки: постоянная ошибка — FAILED, исчерпаны попытки — DEAD,
+    иначе доставка остаётся в очереди до следующей попытки.
+    '''
+    delivery.last_error = f'{type(error).__name__}: {error}'[:255]
+    logger.error(f'\nНЕ ПОЛУЧИЛОСЬ ОТПРАВИТЬ {delivery.channel.upper()} (попытка {delivery.attempts}): {error}')
+    delivery.next_attempt_at = None
+    if is_permanent(delivery.channel, error):
+        delivery.status = DeliveryStatus.FAILED
+    elif delivery.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        delivery.status = DeliveryStatus.DEAD
+    else:
+        delivery.next_attempt_at = now + retry_delay(delivery.attempts)
+
+
+def claim_notification(notification, worker=None, lease=None):
+    '''
+    Захват доставок одного уведомления для отправки без очереди (представления, send_notification).
+    Тот же условный UPDATE, что в claim_batch, но без ожидания срока повтора:
+    доставку, которую уже держит воркер, отправит он, а не повторный вызов.
+
+    :param worker: Имя для locked_by, по умолчанию узел:pid процесса.
+    :param lease: Срок аренды, секунд, по умолчанию NOTIFICATION_LEASE_TIMEOUT.
+    :return: Захваченные доставки с select_related('notification__user', 'notification__message').
+    '''
+    worker = worker or worker_name()
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=lease or settings.NOTIFICATION_LEASE_TIMEOUT)
+    notification.deliveries.pending().unleased(now).update(locked_until=locked_until, locked_by=worker)
+    return list(notification.deliveries.filter(locked_by=worker, locked_until=locked_until)
+                .select_related('notification__user', 'notification__message').order_by('id'))
+
+
+def deliver_notification(notification):
+    '''
+    Доставка одного уведомления по всем каналам в очереди.
+    Доставки сначала захватываются (claim_notification), чтобы их одновременно не отправил воркер.
+    Статусы сохраняются одним bulk_update узких записей Delivery.
+
+    :return: Список доставок с новыми статусами.
+    '''
+    deliveries = claim_notification(notification)
+    leases = _leases(deliveries)
+    _dispatch(deliveries)
+    _save_held(deliveries, leases)
+    return deliveries
+
+
+async def adeliver_notification(notification):
+    '''
+    Асинхронная доставка одного уведомления без блокировки потока:
+    Telegram через aiohttp, СМС через асинхронный клиент Twilio, email в отдельном потоке.
+    Доставки захватываются так же, как в deliver_notification.
+    '''
+    deliveries = await sync_to_async(claim_notification)(notification)
+    leases = _leases(deliveries)
+    await _adispatch(deliveries)
+    await sync_to_async(_save_held)(deliveries, leases)
+    return deliveries
+
+
+def claim_batch(worker, batch_size, lease=None, partitions=None, partition_count=0):
+    '''
+    Захват пачки доставок воркером на lease секунд (аренда): пока она не истекла, доставки
+    не видны другим воркерам, а доставки упавшего воркера после её истечения забирают остальные.
+    На PostgreSQL кандидаты выбираются через select_for_update(skip_locked), и воркеры
+    не ждут друг друга на одних и тех же строках. На SQLite блокировок строк нет, поэтому
+    захват — условный UPDATE: строку, которую уже взял другой воркер, он не перезапишет.
+
+    :param worker: Имя воркера (узел:pid), записывается в locked_by.
+    :param lease: Срок аренды, секунд, по умолчанию NOTIFICATION_LEASE_TIMEOUT.
+    :param partitions: Партиции по user_id, которые обрабатывает воркер
+        (все доставки пользователя достаются одному воркеру и забираются по порядку id).
+    :param partition_count: Всего партиций, 0 — без партиций.
+    :return: Захваченные доставки с select_related('notification__user', 'notification__message').
+    '''
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=lease or settings.NOTIFICATION_LEASE_TIMEOUT)
+    candidates = Delivery.objects.claimable(now)
+    if partition_count:
+        candidates = candidates.in_partitions(partitions, partition_count)
+    candidates = candidates.order_by('id').values_list('id', flat=True)
+    if connection.features.has_select_for_update_skip_locked:
+        of = ('self',) if connection.features.has_select_for_update_of else ()
+        candidates = candidates.select_for_update(skip_locked=True, of=of)
+    with transaction.atomic():
+        ids = list(candidates[:batch_size])
+        Delivery.objects.claimable(now).filter(pk__in=ids).update(locked_until=locked_until, locked_by=worker)
+    return list(Delivery.objects.filter(pk__in=ids, locked_by=worker, locked_until=locked_until)
+                .select_related('notification__user', 'notification__message').order_by('id'))
+
+
+def deliver_batch(deliveries):
+    '''
+    Доставка пачки доставок (с select_related('notification__user', 'notification__message')).
+    Доставки одного сообщения по одному каналу уходят пачками через send_batch бэкенда,
+    статусы пачки сохраняются одним bulk_update по доставкам, которые воркер ещё держит.
+    '''
+    leases = _leases(deliveries)
+    _dispatch(deliveries)
+    _save_held(deliveries, leases)
+    return deliveries
+
+
+def _leases(deliveries):
+    ''' Аренда каждой доставки на момент захвата: (locked_by, locked_until). '''
+    return [(delivery.locked_by, delivery.locked_until) for delivery in deliveries]
+
+
+def _save_held(deliveries, leases):
+    '''
+    Сохраняет статусы только тех доставок, аренду которых ещё держит этот вызов.
+    Если пачка пережила аренду и доставку забрал другой воркер, её статус запишет он.
+
+    :param leases: Аренда каждой доставки на момент захвата (_leases).
+    '''
+    held = defaultdict(list)
+    for delivery, lease in zip(deliveries, leases):
+        held[lease].append(delivery)
+    saved = sum(Delivery.objects.filter(locked_by=worker, locked_until=until).bulk_update(group, DELIVERY_FIELDS)
+                for (worker, until), group in held.items())
+    if saved < len(deliveries):
+        logger.warning(f'\nАРЕНДА ИСТЕКЛА: {len(deliveries) - saved} доставок забрал другой воркер, их статус не сохранён.')
+
+
+def replay_dead(deliveries):
+    '''
+    Повторная постановка в очередь доставок из dead-letter одним UPDATE.
+    Сбрасывает попытки и ошибку.
+
+    :param deliveries: QuerySet доставок.
+    :return: Количество возвращённых в очередь доставок.
+    '''
+    return deliveries.filter(status=DeliveryStatus.DEAD).update(
+        status=DeliveryStatus.PENDING, attempts=0, last_error='', next_attempt_at=None, updated_at=timezone.now())
+
+
+def send_notification(user, message, channels=CHANNELS):
+    '''Отправка уведомления по выбранным каналам сразу, без очереди. '''
+    notification = enqueue_notification(user, message, channels)
+    return deliver_notification(notification) if notification is not None else []
@@ -0,0 +1,44 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from django.db.models import Q
+
+PAGE_SIZE = 20
+
+
+def encode_cursor(obj):
+    ''' Курсор на запись: дата добавления и id, закодированные в base64. '''
+    raw = f'{obj.date_add.isoformat()}|{obj.pk}'
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    '''
+    Разбор курсора.
+
+    :raises ValueError: Если курсор повреждён.
+    '''
+    try:
+        date_add, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(date_add), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f'Неверный курсор: {cursor}') from e
+
+
+def keyset_page(queryset, cursor=None, size=PAGE_SIZE):
+    '''
+    Keyset-пагинация от новых записей к старым по (date_add, id).
+    В отличие от OFFSET, каждая страница читается по индексу с места курсора,
+    поэтому страница N стоит столько же, сколько первая.
+
+    :param queryset: QuerySet записей с полем date_add.
+    :param cursor: Курсор из предыдущей страницы или None для первой.
+    :param size: Размер страницы.
+    :return: Записи страницы и курсор следующей страницы (или None).
+    '''
+    queryset = queryset.order_by('-date_add', '-id')
+    if cursor:
+        date_add, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(date_add__lt=date_add) | Q(date_add=date_add, id__lt=pk))
+    items = list(queryset[:size + 1])
+    next_cursor = encode_cursor(items[size - 1]) if len(items) > size else None
+    return items[:size], next_cursor
@@ -0,0 +1,161 @@
+from datetime import datetime, time as dt_time, timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Delivery, Message, Notification, ScheduledNotification
+from .notifications import CHANNELS, reachable_channels
+from loguru import logger
+import heapq
+import time
+
+
+def schedule(user, message, due_at=None, delay=None, channels=CHANNELS, interval=None):
+    '''
+    Планирование уведомления.
+
+    :param due_at: Время отправки; время без пояса считается местным (TIME_ZONE).
+    :param delay: Или задержка от текущего момента (timedelta), например «через 15 минут».
+    :param channels: Каналы доставки.
+    :param interval: Период повторения (timedelta) для регулярных сводок.
+    :return: ScheduledNotification.
+    '''
+    if due_at is None:
+        due_at = timezone.now() + (delay or timedelta())
+    elif timezone.is_naive(due_at):
+        due_at = timezone.make_aware(due_at)
+    return ScheduledNotification.objects.create(user=user, message=Message.for_body(message),
+                                                channels=list(channels), due_at=due_at, interval=interval)
+
+
+def next_local_time(hour, minute=0, now=None):
+    '''
+    Ближайшее наступление времени hh:mm по местному времени (TIME_ZONE), например «в 09:00».
+
+    :return: datetime с поясом.
+    '''
+    now = timezone.localtime(now)
+    due_at = timezone.make_aware(datetime.combine(now.date(), dt_time(hour, minute)))
+    if due_at <= now:
+        due_at = timezone.make_aware(datetime.combine(now.date() + timedelta(days=1), dt_time(hour, minute)))
+    return due_at
+
+
+def fire(items, now):
+    '''
+    Постановка наступивших записей в очередь пачкой: уведомления и доставки (в доступные пользователю каналы)
+    создаются через bulk_create, разовые записи удаляются, регулярные переносятся на ближайший будущий срок
+    (пропущенные за время простоя периоды не отправляются).
+
+    :return: Регулярные записи с новым due_at.
+    '''
+    notifications = [Notification(user_id=item.user_id, message_id=item.message_id) for item in items]
+    Notification.objects.bulk_create(notifications)
+    Delivery.objects.bulk_create([Delivery(notification=notification, channel=channel)
+                                  for notification, item in zip(notifications, items)
+                                  for channel in reachable_channels(item.user, _known_channels(item))])
+    recurring = [item for item in items if item.interval]
+    for item in recurring:
+        item.due_at += item.interval * ((now - item.due_at) // item.interval + 1)
+    ScheduledNotification.objects.bulk_update(recurring, ['due_at'])
+    ScheduledNotification.objects.filter(pk__in=[item.pk for item in items if not item.interval]).delete()
+    return recurring
+
+
+def _known_channels(item):
+    '''
+    Каналы записи, которые есть в NOTIFICATION_CHANNELS. Канал могли убрать из настроек после
+    планирования: такой канал пропускается, а не роняет всю пачку.
+    '''
+    unknown = [channel for channel in item.channels if channel not in settings.NOTIFICATION_CHANNELS]
+    if unknown:
+        logger.warning(f'\nПЛАНИРОВЩИК: каналы {unknown} не настроены, запись {item.pk} отправляется без них.')
+    return [channel for channel in item.channels if channel in settings.NOTIFICATION_CHANNELS]
+
+
+class Scheduler:
+    '''
+    Планировщик отложенных уведомлений.
+    Держит в памяти только ближайшие записи (срок в пределах horizon секунд, не больше prefetch штук)
+    в куче по due_at и спит до ближайшего срока, а не опрашивает таблицу каждую секунду.
+    Кандидаты читаются диапазоном по индексу due_at раз в refresh секунд, поэтому записи,
+    созданные после чтения, отправляются с опозданием не больше refresh секунд.
+    Наступившие записи забираются пачками по batch_size в одной транзакции
+    (на PostgreSQL — select_for_update(skip_locked), чтобы несколько планировщиков не взяли одно и то же).
+    '''
+
+    def __init__(self, batch_size=500, horizon=None, refresh=None, prefetch=None,
+                 now=timezone.now, sleep=time.sleep):
+        self.batch_size = batch_size
+        self.horizon = timedelta(seconds=horizon or settings.SCHEDULER_HORIZON)
+        self.refresh_interval = timedelta(seconds=refresh or settings.SCHEDULER_REFRESH_INTERVAL)
+        self.prefetch = prefetch or settings.SCHEDULER_PREFETCH
+        self.now = now
+        self.sleep = sleep
+        self._heap = []  # (due_at, id)
+        self._loaded_until = None  # после этого времени кучу нужно перечитать
+        self._refresh_at = None
+
+    def refresh(self):
+        ''' Перечитывает ближайшие записи из БД в кучу. '''
+        now = self.now()
+        until = now + self.horizon
+        rows = list(ScheduledNotification.objects.filter(due_at__lt=until)
+                    .order_by('due_at', 'id').values_list('due_at', 'id')[:self.prefetch])
+        if len(rows) == self.prefetch:
+            # Загружены не все: к сроку последней записи кучу нужно перечитать. Отправленные разовые
+            # записи к тому времени удалены, поэтому следующее чтение вернёт следующие prefetch записей.
+            until = rows[-1][0]
+        heapq.heapify(rows)
+        self._heap = rows
+        self._loaded_until = until
+        self._refresh_at = now + self.refresh_interval
+
+    def run_due(self):
+        '''
+        Отправляет в очередь все наступившие записи из кучи.
+
+        :return: Сколько уведомлений поставлено в очередь.
+        '''
+        now = self.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        fired = 0
+        for start in range(0, len(due), self.batch_size):
+            fired += self._claim(due[start:start + self.batch_size], now)
+        return fired
+
+    def _claim(self, ids, now):
+        items = ScheduledNotification.objects.due(now).filter(pk__in=ids).select_related('user').order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            of = ('self',) if connection.features.has_select_for_update_of else ()
+            items = items.select_for_update(skip_locked=True, of=of)
+        with transaction.atomic():
+            items = list(items)  # запись могли отменить или перенести после чтения в кучу
+            recurring = fire(items, now)
+        for item in recurring:
+            if item.due_at < self._loaded_until:
+                heapq.heappush(self._heap, (item.due_at, item.pk))
+        return len(items)
+
+    def wait_time(self):
+        ''' Сколько секунд спать до ближайшего срока или перечитывания. '''
+        wake_at = min(self._refresh_at, self._loaded_until)
+        if self._heap:
+            wake_at = min(wake_at, self._heap[0][0])
+        return max(0.0, (wake_at - self.now()).total_seconds())
+
+    def tick(self):
+        ''' Один проход: перечитать кучу, если пора, и отправить наступившие записи. '''
+        now = self.now()
+        if self._refresh_at is None or now >= self._refresh_at or now >= self._loaded_until:
+            self.refresh()
+        fired = self.run_due()
+        if fired:
+            logger.info(f'\nПЛАНИРОВЩИК поставил в очередь: {fired} уведомлений.')
+        return fired
+
+    def run_forever(self):
+        while True:
+            self.tick()
+            self.sleep(self.wait_time())
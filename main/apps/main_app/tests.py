@@ -1,7 +1,46 @@
+from django.conf import settings
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from unittest.mock import patch
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, Mock, patch
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+import threading
+from apps.main_app.models import Delivery, DeliveryStatus, Message, Notification, ScheduledNotification
+from apps.main_app.notifications import (CHANNELS, batch_time, claim_batch, deliver_batch, deliver_notification, enqueue_notification, enqueue_once,
+                                         idempotency_key, replay_dead, send_notification)
+from apps.main_app.backends import get_backend, locmem
+from apps.main_app.backends.base import PermanentDeliveryError
+from apps.main_app import benchmark, metrics
+from apps.main_app.broadcast import broadcast
+from apps.main_app.checks import check_provider_config
+from apps.main_app.fake_providers import provider_settings, running_providers
+from apps.main_app.pagination import keyset_page
+from apps.main_app.scheduler import Scheduler, next_local_time, schedule
+from apps.main_app.async_bot import handle_start
+from apps.main_app.bot import get_bot
+from apps.main_app.transports import email, sms
+from apps.main_app.transports.telegram import TelegramScheduler
+from apps.main_app.workers import assign, run_pool
+from prometheus_client import REGISTRY
+from telebot.apihelper import ApiTelegramException
+from core.config import database as database_settings, load as load_config
+from core.db.sqlite3.base import DatabaseWrapper as SqliteWrapper
+import time
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
 
 User = get_user_model()
 
@@ -38,46 +77,1086 @@ class MainAppViewsTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'main_app/index.html')
 
-    @patch('apps.main_app.views.send_all_notification')
-    def test_notify_user_calls_send_all_notification(self, mock_send):
+    @patch('apps.main_app.views.enqueue_once', return_value=(Mock(), True))
+    def test_notify_user_enqueues_all_channels(self, mock_send):
         """
         Проверка, что при обращении к представлению отправки уведомлений
-        вызывается функция send_all_notification с правильными параметрами.
+        уведомление ставится в очередь по всем каналам.
         """
         self.client.login(username='testuser', password='testpassword')
         url = reverse('main_app:send_notification')
         self.client.get(url)
-        mock_send.assert_called_once_with(self.user, "This is a test notification!")
+        mock_send.assert_called_once_with(self.user, "This is a test notification!", channels=CHANNELS, key=None)
 
-    @patch('apps.main_app.views.send_sms_notification')
-    def test_sms_notification_calls_send_sms_notification(self, mock_send):
+    @patch('apps.main_app.views.enqueue_once', return_value=(Mock(), True))
+    def test_sms_notification_enqueues_sms(self, mock_send):
         """
         Проверка, что при обращении к представлению отправки SMS
-        вызывается функция send_sms_notification с правильными параметрами.
+        уведомление ставится в очередь только по каналу SMS.
         """
         self.client.login(username='testuser', password='testpassword')
         url = reverse('main_app:send_sms')
         self.client.get(url)
-        mock_send.assert_called_once_with(self.user, "Это тестовое сообщение написано специально для вас!")
+        mock_send.assert_called_once_with(self.user, "Это тестовое сообщение написано специально для вас!",
+                                          channels=('sms',), key=None)
 
-    @patch('apps.main_app.views.send_email_notification')
-    def test_email_notification_calls_send_email_notification(self, mock_send):
+    @patch('apps.main_app.views.enqueue_once', return_value=(Mock(), True))
+    def test_email_notification_enqueues_email(self, mock_send):
         """
         Проверка, что при обращении к представлению отправки email
-        вызывается функция send_email_notification с правильными параметрами.
+        уведомление ставится в очередь только по каналу email.
         """
         self.client.login(username='testuser', password='testpassword')
         url = reverse('main_app:send_email')
         self.client.get(url)
-        mock_send.assert_called_once_with(self.user, "Это тестовое сообщение написано специально для вас!")
+        mock_send.assert_called_once_with(self.user, "Это тестовое сообщение написано специально для вас!",
+                                          channels=('email',), key=None)
 
-    @patch('apps.main_app.views.send_telegram_notification')
-    def test_telegram_notification_calls_send_telegram_notification(self, mock_send):
+    @patch('apps.main_app.views.enqueue_once', return_value=(Mock(), True))
+    def test_telegram_notification_enqueues_telegram(self, mock_send):
         """
         Проверка, что при обращении к представлению отправки Telegram-уведомления
-        вызывается функция send_telegram_notification с правильными параметрами.
+        уведомление ставится в очередь только по каналу Telegram.
         """
         self.client.login(username='testuser', password='testpassword')
         url = reverse('main_app:send_tg')
         self.client.get(url)
-        mock_send.assert_called_once_with(self.user, "Это тестовое сообщение написано специально для вас!")
+        mock_send.assert_called_once_with(self.user, "Это тестовое сообщение написано специально для вас!",
+                                          channels=('telegram',), key=None)
+
+
+class IdempotencyTestCase(TestCase):
+    """
+    Тесты идемпотентности постановки уведомлений в очередь.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword',
+                                             phone_number='+79990000000')
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_repeated_request_returns_existing_notification(self):
+        """
+        Проверка, что повтор запроса в пределах окна не создаёт второе уведомление и показывает статус первого.
+        """
+        url = reverse('main_app:send_sms')
+        self.assertFalse(self.client.get(url).context['duplicate'])
+        response = self.client.get(url)
+        self.assertTrue(response.context['duplicate'])
+        self.assertContains(response, 'повторно не отправляем')
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(Delivery.objects.count(), 1)
+
+    def test_client_key_overrides_derived_key(self):
+        """
+        Проверка, что заголовок Idempotency-Key задаёт ключ: разные ключи — разные уведомления.
+        """
+        url = reverse('main_app:send_sms')
+        self.client.get(url, HTTP_IDEMPOTENCY_KEY='a')
+        self.client.get(url, HTTP_IDEMPOTENCY_KEY='a')
+        self.client.get(url, HTTP_IDEMPOTENCY_KEY='b')
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_unreachable_request_does_not_take_key(self):
+        """
+        Проверка, что запрос без доступных каналов не создаёт уведомление и не занимает ключ:
+        после того как пользователь указал адрес, повтор с тем же ключом ставит уведомление в очередь.
+        """
+        url = reverse('main_app:send_email')
+        response = self.client.get(url, HTTP_IDEMPOTENCY_KEY='a')
+        self.assertTrue(response.context['unreachable'])
+        self.assertFalse(Notification.objects.exists())
+        self.user.email = 'test@example.com'
+        self.user.save()
+        self.assertFalse(self.client.get(url, HTTP_IDEMPOTENCY_KEY='a').context['duplicate'])
+        self.assertEqual(Delivery.objects.get().channel, 'email')
+
+    def test_derived_key_depends_on_window_user_and_channels(self):
+        """
+        Проверка, что выведенный ключ меняется со сменой окна времени, пользователя и каналов.
+        """
+        other = User.objects.create_user(username='other', password='testpassword')
+        key = idempotency_key(self.user, 'hello', ('sms',), now=0)
+        self.assertEqual(key, idempotency_key(self.user, 'hello', ('sms',), now=59))
+        self.assertNotEqual(key, idempotency_key(self.user, 'hello', ('sms',), now=60))
+        self.assertNotEqual(key, idempotency_key(other, 'hello', ('sms',), now=0))
+        self.assertNotEqual(key, idempotency_key(self.user, 'hello', ('sms', 'email'), now=0))
+
+    def test_concurrent_duplicate_falls_back_to_existing(self):
+        """
+        Проверка, что при нарушении уникального ключа возвращается уже созданное уведомление.
+        """
+        first, created = enqueue_once(self.user, 'hello', channels=('sms',), key='k')
+        self.assertTrue(created)
+        with patch('django.db.models.query.QuerySet.first', return_value=None):  # повтор не увидел первое
+            second, created = enqueue_once(self.user, 'hello', channels=('sms',), key='k')
+        self.assertFalse(created)
+        self.assertEqual(second, first)
+
+
+class NotificationOutboxTestCase(TestCase):
+    """
+    Тесты очереди уведомлений (outbox) и воркера send_notifications.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword',
+                                             email='test@example.com', phone_number='+79990000000',
+                                             telegram_id=123)
+
+    def test_enqueue_marks_requested_channels_pending(self):
+        """
+        Проверка, что постановка в очередь не отправляет сообщения,
+        а помечает запрошенные каналы статусом "в очереди".
+        """
+        notification = enqueue_notification(self.user, 'hello', channels=('email', 'telegram'))
+        deliveries = notification.delivery_map()
+        self.assertEqual(set(deliveries), {'email', 'telegram'})
+        self.assertTrue(all(d.status == DeliveryStatus.PENDING for d in deliveries.values()))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_same_text_is_stored_once(self):
+        """
+        Проверка, что одинаковый текст хранится в одной записи Message.
+        """
+        first = enqueue_notification(self.user, 'hello')
+        second = enqueue_notification(self.user, 'hello')
+        self.assertEqual(first.message_id, second.message_id)
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_worker_delivers_pending_notifications(self):
+        """
+        Проверка, что воркер отправляет уведомления из очереди
+        и сохраняет итоговый статус каждого канала.
+        """
+        mock_telegram = Mock(return_value=42)
+        notification = enqueue_notification(self.user, 'hello')
+        with patch.object(get_backend('sms'), 'send', Mock(side_effect=Exception('no twilio'))), \
+                patch.object(get_backend('telegram'), 'send', mock_telegram):
+            call_command('send_notifications', once=True)
+
+        deliveries = notification.delivery_map()
+        self.assertEqual(deliveries['email'].status, DeliveryStatus.SENT)
+        self.assertEqual(deliveries['email'].provider_message_id, mail.outbox[0].extra_headers['Message-ID'])
+        self.assertEqual(deliveries['sms'].status, DeliveryStatus.PENDING)
+        self.assertEqual(deliveries['telegram'].status, DeliveryStatus.SENT)
+        self.assertEqual(deliveries['telegram'].provider_message_id, '42')
+        self.assertIsNotNone(deliveries['telegram'].sent_at)
+        self.assertEqual(mail.outbox[0].to, ['test@example.com'])
+        mock_telegram.assert_called_once_with(self.user, 'hello')
+        self.assertEqual(deliveries['sms'].attempts, 1)
+        self.assertIsNotNone(deliveries['sms'].next_attempt_at)
+        self.assertFalse(Delivery.objects.due(timezone.now()).exists())
+
+    @override_settings(NOTIFICATION_CHANNEL_TIMEOUT=0.1)
+    def test_slow_channel_does_not_block_others(self):
+        """
+        Проверка, что каналы отправляются параллельно, а пачка, отправка которой началась,
+        сохраняет настоящий результат, даже если заняла больше NOTIFICATION_CHANNEL_TIMEOUT.
+        """
+        started = threading.Event()
+        mock_telegram = Mock(side_effect=lambda user, message: started.wait(1) and 7)
+
+        def slow_sms(user, message):
+            started.set()
+            time.sleep(0.3)
+            return 'SM1'
+
+        notification = enqueue_notification(self.user, 'hello')
+        with patch.object(get_backend('sms'), 'send', slow_sms), \
+                patch.object(get_backend('telegram'), 'send', mock_telegram):
+            deliver_notification(notification)
+
+        deliveries = notification.delivery_map()
+        self.assertEqual({channel: delivery.status for channel, delivery in deliveries.items()},
+                         dict.fromkeys(['email', 'sms', 'telegram'], DeliveryStatus.SENT))
+        self.assertEqual((deliveries['sms'].provider_message_id, deliveries['sms'].locked_by), ('SM1', ''))
+
+    @override_settings(NOTIFICATION_CHANNEL_TIMEOUT=0.1)
+    def test_unstarted_chunk_returns_to_queue(self):
+        """
+        Проверка, что пачка, не дождавшаяся свободного потока, отменяется
+        и возвращается в очередь без учёта попытки.
+        """
+        notification = enqueue_notification(self.user, 'hello', channels=('sms', 'telegram'))
+        with patch('apps.main_app.notifications.fanout_executor', ThreadPoolExecutor(max_workers=1)), \
+                patch.object(get_backend('sms'), 'send', lambda user, message: time.sleep(0.3) or 'SM1'), \
+                patch.object(get_backend('telegram'), 'send', Mock(return_value=7)) as mock_telegram:
+            deliver_notification(notification)
+        mock_telegram.assert_not_called()
+        deliveries = notification.delivery_map()
+        self.assertEqual(deliveries['sms'].status, DeliveryStatus.SENT)
+        telegram = deliveries['telegram']
+        self.assertEqual((telegram.status, telegram.attempts, telegram.locked_until), (DeliveryStatus.PENDING, 0, None))
+
+
+class DeliveryLeaseTestCase(TestCase):
+    """
+    Тесты захвата доставок воркерами с арендой (claim_batch) и деления очереди на партиции.
+    """
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'lease{i}', email=f'lease{i}@example.com')
+                      for i in range(4)]
+        for user in self.users:
+            enqueue_notification(user, 'hello', channels=('email',))
+
+    def test_claimed_deliveries_are_hidden_from_other_workers(self):
+        """
+        Проверка, что пачку, забранную одним воркером, не получит другой.
+        """
+        first = claim_batch('node-a:1', 3)
+        second = claim_batch('node-b:1', 3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({delivery.pk for delivery in first} & {delivery.pk for delivery in second})
+        self.assertTrue(all(delivery.locked_by == 'node-a:1' and delivery.locked_until for delivery in first))
+        self.assertEqual(claim_batch('node-c:1', 3), [])
+
+    def test_expired_lease_is_reclaimed(self):
+        """
+        Проверка, что доставки упавшего воркера забирает другой воркер после истечения аренды.
+        """
+        claim_batch('node-a:1', 10, lease=60)
+        Delivery.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = claim_batch('node-b:1', 10)
+        self.assertEqual(len(reclaimed), 4)
+        self.assertEqual(set(Delivery.objects.values_list('locked_by', flat=True)), {'node-b:1'})
+
+    def test_expired_batch_does_not_overwrite_new_owner(self):
+        """
+        Проверка, что воркер, пачка которого пережила аренду, не перезаписывает статусы
+        доставок, которые уже забрал другой воркер.
+        """
+        batch = claim_batch('node-a:1', 10, lease=60)
+        Delivery.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        claim_batch('node-b:1', 10)
+        deliver_batch(batch)
+        self.assertEqual(set(Delivery.objects.values_list('status', 'locked_by')), {(DeliveryStatus.PENDING, 'node-b:1')})
+
+    def test_short_lease_is_clamped_to_batch_time(self):
+        """
+        Проверка, что аренда короче худшего времени отправки пачки увеличивается до него.
+        """
+        with patch('apps.main_app.management.commands.send_notifications.Command.work') as work:
+            call_command('send_notifications', once=True, lease=1, batch_size=20)
+        self.assertEqual(work.call_args.kwargs['lease'], batch_time(20))
+
+    def test_delivery_releases_lease(self):
+        """
+        Проверка, что после отправки доставка сохраняет статус и освобождается.
+        """
+        deliver_batch(claim_batch('node-a:1', 10))
+        self.assertEqual(Delivery.objects.filter(status=DeliveryStatus.SENT, locked_until=None, locked_by='').count(), 4)
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_inline_send_skips_claimed_deliveries(self):
+        """
+        Проверка, что отправка без очереди не трогает доставку, которую уже забрал воркер.
+        """
+        [claimed] = claim_batch('node-a:1', 1)
+        deliver_notification(claimed.notification)
+        self.assertEqual(mail.outbox, [])
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.locked_by), (DeliveryStatus.PENDING, 'node-a:1'))
+        [delivery] = deliver_notification(Notification.objects.exclude(pk=claimed.notification_id).first())
+        self.assertEqual((delivery.status, delivery.locked_by), (DeliveryStatus.SENT, ''))
+
+    def test_partitions_split_users(self):
+        """
+        Проверка, что партиции по user_id делят пользователей без пересечений,
+        а все доставки пользователя попадают в одну партицию.
+        """
+        enqueue_notification(self.users[0], 'again', channels=('email',))
+        claimed = [claim_batch(f'node:{partition}', 10, partitions=[partition], partition_count=2)
+                   for partition in range(2)]
+        self.assertEqual(sum(map(len, claimed)), 5)
+        for partition, batch in enumerate(claimed):
+            self.assertTrue(all(delivery.notification.user_id % 2 == partition for delivery in batch))
+        self.assertEqual(assign([0, 1, 2, 3, 4], 2), [[0, 2, 4], [1, 3]])
+
+    def test_pool_shares_telegram_limits(self):
+        """
+        Проверка, что воркеры пула делят TELEGRAM_GLOBAL_RATE поровну
+        и без --partitions получают по партиции user_id.
+        """
+        with patch('apps.main_app.workers.multiprocessing.get_context') as get_context:
+            run_pool(2, batch_size=10, once=True)
+        shares = [call.kwargs['args'] for call in get_context.return_value.Process.call_args_list]
+        self.assertEqual([(options['partitions'], options['partition_count']) for _, options, *_ in shares],
+                         [([0], 2), ([1], 2)])
+        self.assertEqual({overrides['TELEGRAM_GLOBAL_RATE'] for _, _, _, overrides, *_ in shares},
+                         {settings.TELEGRAM_GLOBAL_RATE / 2})
+
+    def test_worker_options_are_validated(self):
+        """
+        Проверка, что воркеров не может быть больше, чем партиций узла.
+        """
+        with self.assertRaises(CommandError):
+            call_command('send_notifications', once=True, workers=3, partitions=4, partition=[0, 1])
+        with self.assertRaises(CommandError):
+            call_command('send_notifications', once=True, partitions=2, partition=[2])
+        call_command('send_notifications', once=True, partitions=2, partition=[0, 1])
+        self.assertEqual(Delivery.objects.filter(status=DeliveryStatus.SENT).count(), 4)
+
+
+class BroadcastTestCase(TestCase):
+    """
+    Тесты массовой рассылки: функция broadcast, команда и представление для staff.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create([
+            User(username=f'user{i}', telegram_id=i if i % 2 else None, email='' if i % 2 else f'user{i}@example.com')
+            for i in range(10)
+        ])
+        cls.staff = User.objects.create_user(username='staff', password='testpassword', is_staff=True)
+
+    def test_broadcast_uses_batched_queries(self):
+        """
+        Проверка, что число запросов зависит от числа пачек, а не пользователей,
+        а доставки создаются только в доступные пользователю каналы.
+        """
+        Message.for_body('hi')
+        # текст + чтение получателей + 3 пачки по два bulk_create (уведомления и доставки)
+        with self.assertNumQueries(1 + 1 + 3 * 2):
+            total = broadcast(User.objects.filter(username__startswith='user'), 'hi',
+                              channels=('telegram', 'email'), batch_size=4)
+        self.assertEqual(total, 10)
+        self.assertEqual(Message.objects.count(), 1)
+        self.assertEqual(Delivery.objects.filter(channel='telegram', notification__user__telegram_id__isnull=False,
+                                                 status=DeliveryStatus.PENDING).count(), 5)
+        self.assertEqual(Delivery.objects.filter(channel='email', notification__user__email__gt='').count(), 5)
+        self.assertEqual(Delivery.objects.count(), 10)
+
+    def test_broadcast_skips_unreachable_users(self):
+        """
+        Проверка, что пользователи без адреса в выбранных каналах отсекаются одним запросом
+        и не получают уведомлений.
+        """
+        total = broadcast(User.objects.all(), 'hi', channels=('telegram',))
+        self.assertEqual(total, 5)
+        self.assertFalse(Notification.objects.filter(user__telegram_id__isnull=True).exists())
+
+    def test_broadcast_command_targets_audience(self):
+        """
+        Проверка, что команда broadcast ставит в очередь только выбранную аудиторию.
+        """
+        call_command('broadcast', 'hi', '--audience', 'telegram', '--channels', 'telegram', stdout=Mock())
+        self.assertEqual(Notification.objects.count(), 5)
+        self.assertFalse(Notification.objects.filter(user__telegram_id__isnull=True).exists())
+
+    def test_broadcast_view_requires_staff(self):
+        """
+        Проверка, что рассылка доступна только staff и ставит уведомления в очередь.
+        """
+        url = reverse('main_app:broadcast')
+        User.objects.create_user(username='regular', password='testpassword')
+        self.client.login(username='regular', password='testpassword')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.login(username='staff', password='testpassword')
+        response = self.client.post(url, {'message': 'hi', 'audience': 'all', 'channels': ['email']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total'], User.objects.filter(can_email=True).count())
+
+
+@override_settings(TWILIO_ACCOUNT_SID='AC123', TWILIO_AUTH_TOKEN='secret', TWILIO_PHONE_NUMBER='+10000000000')
+class SmsTransportTestCase(TestCase):
+    """
+    Тесты транспорта СМС: один клиент Twilio с пулом соединений на весь процесс.
+    """
+
+    def setUp(self):
+        sms._client = None
+        self.addCleanup(setattr, sms, '_client', None)
+
+    def test_client_is_built_once_with_connection_pool(self):
+        """
+        Проверка, что клиент создаётся один раз и его HTTP-сессия держит пул соединений.
+        """
+        client = sms.get_client()
+        self.assertIs(sms.get_client(), client)
+        adapter = client.http_client.session.get_adapter('https://api.twilio.com')
+        self.assertEqual(adapter._pool_maxsize, 16)
+
+    def test_send_sms_reuses_client(self):
+        """
+        Проверка, что несколько СМС отправляются через один и тот же клиент.
+        """
+        with patch.object(sms, '_build_client') as mock_build:
+            sms.send_sms('+79990000000', 'one')
+            sms.send_sms('+79990000000', 'two')
+        mock_build.assert_called_once()
+        mock_build.return_value.messages.create.assert_called_with(
+            body='two', from_='+10000000000', to='+79990000000')
+
+
+class EmailTransportTestCase(TestCase):
+    """
+    Тесты постоянного SMTP-соединения.
+    """
+
+    def setUp(self):
+        patcher = patch('apps.main_app.transports.email.get_connection',
+                        side_effect=lambda **kwargs: Mock(send_messages=Mock(side_effect=len)))
+        self.get_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connection_reused_up_to_limit(self):
+        """
+        Проверка, что письма идут через одно соединение,
+        а после max_messages соединение переоткрывается.
+        """
+        session = email.EmailSession(idle_timeout=60, max_messages=2)
+        sent = session.send_messages([email.build_message('a@example.com', str(i)) for i in range(5)])
+        self.assertEqual(sent, 5)
+        self.assertEqual(self.get_connection.call_count, 3)
+
+    def test_reconnects_after_idle_timeout(self):
+        """
+        Проверка, что простаивавшее соединение переоткрывается перед отправкой.
+        """
+        session = email.EmailSession(idle_timeout=0, max_messages=100)
+        session.send_messages([email.build_message('a@example.com', 'one')])
+        first = session._connection
+        session._last_used -= 1
+        session.send_messages([email.build_message('a@example.com', 'two')])
+        first.close.assert_called_once()
+        self.assertEqual(self.get_connection.call_count, 2)
+
+    def test_reconnects_when_server_disconnects(self):
+        """
+        Проверка, что при разрыве соединения сервером письмо отправляется через новое соединение.
+        """
+        session = email.EmailSession(idle_timeout=60, max_messages=100)
+        session.send_messages([email.build_message('a@example.com', 'one')])
+        session._connection.send_messages.side_effect = SMTPServerDisconnected()
+        self.assertEqual(session.send_messages([email.build_message('a@example.com', 'two')]), 1)
+        self.assertEqual(self.get_connection.call_count, 2)
+
+    def test_rejected_message_fails_alone(self):
+        """
+        Проверка, что отказ сервера по одному адресу помечает ошибкой только это письмо:
+        письма до и после него отправлены через то же соединение и не повторяются.
+        """
+        rejected = SMTPRecipientsRefused({'b@example.com': (550, b'no such user')})
+
+        def send_messages(messages):
+            if messages[0].to == ['b@example.com']:
+                raise rejected
+            return len(messages)
+
+        self.get_connection.side_effect = lambda **kwargs: Mock(send_messages=Mock(side_effect=send_messages))
+        session = email.EmailSession(idle_timeout=60, max_messages=100)
+        results = session.send_each([email.build_message(f'{name}@example.com', 'hi') for name in 'abc'])
+        self.assertEqual(results, [None, rejected, None])
+        self.assertEqual(self.get_connection.call_count, 1)
+
+
+class TelegramSchedulerTestCase(TestCase):
+    """
+    Тесты планировщика отправки в Telegram с вёдрами токенов.
+    """
+
+    def test_per_chat_rate_is_respected(self):
+        """
+        Проверка, что сообщения в один чат идут не быстрее лимита на чат,
+        а в разные чаты — без ожидания.
+        """
+        scheduler = TelegramScheduler(Mock(), global_rate=100, chat_rate=10)
+        started = time.monotonic()
+        scheduler.send_message(1, 'a')
+        scheduler.send_message(2, 'b')
+        self.assertLess(time.monotonic() - started, 0.05)
+        scheduler.send_message(1, 'c')
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(scheduler.bot.send_message.call_count, 3)
+        scheduler.bot.send_message.assert_called_with(1, 'c', timeout=settings.NOTIFICATION_CHANNEL_TIMEOUT)
+        self.assertGreater(scheduler.throughput(), 0)
+
+    def test_retries_after_429(self):
+        """
+        Проверка, что после ответа 429 отправка ставится на паузу retry_after и повторяется.
+        """
+        error = ApiTelegramException('sendMessage', None, {
+            'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 0}})
+        bot = Mock()
+        bot.send_message.side_effect = [error, 'ok']
+        scheduler = TelegramScheduler(bot, global_rate=100, chat_rate=100)
+        self.assertEqual(scheduler.send_message(1, 'a'), 'ok')
+        self.assertEqual(bot.send_message.call_count, 2)
+
+    def test_other_errors_are_not_retried(self):
+        """
+        Проверка, что ошибки, кроме 429, не повторяются.
+        """
+        error = ApiTelegramException('sendMessage', None, {'error_code': 400, 'description': 'chat not found'})
+        bot = Mock()
+        bot.send_message.side_effect = error
+        scheduler = TelegramScheduler(bot, global_rate=100, chat_rate=100)
+        with self.assertRaises(ApiTelegramException):
+            scheduler.send_message(1, 'a')
+        bot.send_message.assert_called_once()
+
+    def test_async_send_shares_buckets_and_retries_after_429(self):
+        """
+        Проверка, что асинхронная отправка ждёт токен того же ведра чата, что и синхронная,
+        и после ответа 429 повторяется.
+        """
+        error = ApiTelegramException('sendMessage', None, {
+            'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 0}})
+        scheduler = TelegramScheduler(Mock(), global_rate=100, chat_rate=10)
+        started = time.monotonic()
+        scheduler.send_message(1, 'a')
+        with patch('apps.main_app.transports.telegram._apost', AsyncMock(side_effect=[error, {'message_id': 7}])) as post:
+            self.assertEqual(asyncio.run(scheduler.asend_message(1, 'b')), {'message_id': 7})
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(post.await_count, 2)
+
+
+class NotificationRetryTestCase(TestCase):
+    """
+    Тесты повторных попыток, постоянных ошибок и dead-letter.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword', telegram_id=123)
+
+    def test_missing_address_is_permanent_failure(self):
+        """
+        Проверка, что канал без адреса не ставится в очередь, а если email удалён
+        после постановки в очередь — это постоянная ошибка без повторов.
+        """
+        self.assertIsNone(enqueue_notification(self.user, 'hello', channels=('email',)))
+        self.user.email = 'test@example.com'
+        self.user.save()
+        notification = enqueue_notification(self.user, 'hello', channels=('email',))
+        self.user.email = ''
+        self.user.save()
+        [delivery] = deliver_notification(notification)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, DeliveryStatus.FAILED)
+        self.assertIsNone(delivery.next_attempt_at)
+        self.assertIn('EMAIL', delivery.last_error)
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=2)
+    def test_exhausted_attempts_move_to_dead_letter_and_replay(self):
+        """
+        Проверка, что после исчерпания попыток канал попадает в dead-letter,
+        а replay_dead возвращает его в очередь со сброшенными попытками.
+        """
+        notification = enqueue_notification(self.user, 'hello', channels=('telegram',))
+        with patch.object(get_backend('telegram'), 'send', Mock(side_effect=ConnectionError())):
+            [delivery] = deliver_notification(notification)
+            self.assertEqual(delivery.status, DeliveryStatus.PENDING)
+            [delivery] = deliver_notification(notification)
+        self.assertEqual(delivery.status, DeliveryStatus.DEAD)
+        self.assertEqual(delivery.attempts, 2)
+        self.assertEqual(list(Delivery.objects.dead()), [delivery])
+
+        self.assertEqual(replay_dead(Delivery.objects.all()), 1)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, DeliveryStatus.PENDING)
+        self.assertEqual(delivery.attempts, 0)
+        self.assertFalse(Delivery.objects.dead().exists())
+
+
+LOCMEM_CHANNELS = {
+    channel: {'BACKEND': 'apps.main_app.backends.locmem.LocmemBackend', 'OPTIONS': {'batch_size': 4}}
+    for channel in ('email', 'sms', 'telegram')
+}
+
+
+class ChannelBackendTestCase(TestCase):
+    """
+    Тесты бэкендов каналов и общего конвейера отправки пачками.
+    """
+
+    def setUp(self):
+        locmem.outbox.clear()
+
+    @override_settings(NOTIFICATION_CHANNELS=LOCMEM_CHANNELS)
+    def test_worker_sends_broadcast_in_batches(self):
+        """
+        Проверка, что доставки одного сообщения уходят пачками по batch_size бэкенда.
+        """
+        User.objects.bulk_create([User(username=f'user{i}', email=f'user{i}@example.com') for i in range(10)])
+        broadcast(User.objects.all(), 'hi', channels=('email',))
+        backend = get_backend('email')
+        with patch.object(backend, 'send_batch', wraps=backend.send_batch) as send_batch:
+            call_command('send_notifications', once=True)
+        self.assertEqual(send_batch.call_count, 3)
+        self.assertEqual(len(locmem.outbox), 10)
+        self.assertFalse(Delivery.objects.exclude(status=DeliveryStatus.SENT).exists())
+        self.assertFalse(Delivery.objects.filter(provider_message_id='').exists())
+
+    def test_email_batch_uses_one_smtp_call(self):
+        """
+        Проверка, что email-бэкенд отправляет пачку одним вызовом SMTP-сессии,
+        а получатель без адреса получает постоянную ошибку, не прерывая пачку.
+        """
+        users = [User(username='a', email='a@example.com'), User(username='b'),
+                 User(username='c', email='c@example.com')]
+        with patch.object(email.get_session(), 'send_each', wraps=email.get_session().send_each) as send:
+            results = get_backend('email').send_batch(users, 'hi')
+        send.assert_called_once()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIsInstance(results[1], PermanentDeliveryError)
+        self.assertEqual(results[0], mail.outbox[0].extra_headers['Message-ID'])
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='123:abc')  # тестам нужен синхронный бот
+class BenchmarkTestCase(TestCase):
+    """
+    Тесты заглушек провайдеров и сценариев замера производительности.
+    """
+
+    def tearDown(self):
+        benchmark.reset_transports()
+
+    def test_send_goes_through_fake_providers(self):
+        """
+        Проверка, что send_notification доходит до заглушек SMTP, Twilio и Telegram по сети.
+        """
+        with running_providers() as providers, override_settings(**provider_settings(providers)):
+            benchmark.reset_transports()
+            result = benchmark.run_send(benchmark.make_users('bench', 2))
+        self.assertEqual(result['ops'], 2)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['queries_per_op'], 0)
+        self.assertEqual([provider.requests for provider in providers.values()], [2, 2, 2])
+
+    def test_provider_errors_are_reported(self):
+        """
+        Проверка, что ошибки заглушек попадают в отчёт как недоставленные сообщения.
+        """
+        with running_providers(error_rate=1) as providers, override_settings(**provider_settings(providers)):
+            benchmark.reset_transports()
+            benchmark.make_users('bulk', 3)
+            result = benchmark.run_bulk(User.objects.filter(username__startswith='bulk'), batch_size=10)
+        self.assertEqual(result['ops'], 9)
+        self.assertEqual(result['errors'], 9)
+        self.assertEqual(Delivery.objects.filter(attempts=1, status=DeliveryStatus.PENDING).count(), 9)
+
+
+class MetricsTestCase(TestCase):
+    """
+    Тесты метрик Prometheus.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword', telegram_id=123,
+                                             email='test@example.com')
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    @override_settings(NOTIFICATION_CHANNELS=LOCMEM_CHANNELS)
+    def test_sends_are_counted_by_result(self):
+        """
+        Проверка, что успешные отправки и ошибки считаются по каналу и классу ошибки.
+        """
+        sent = self.sample('notification_send_total', channel='email', result='ok')
+        failed = self.sample('notification_send_total', channel='telegram', result='ConnectionError')
+        timed = self.sample('notification_send_seconds_count', channel='email')
+        with patch.object(get_backend('telegram'), 'send_batch', Mock(side_effect=ConnectionError())):
+            send_notification(self.user, 'hello', channels=('email', 'telegram'))
+        self.assertEqual(self.sample('notification_send_total', channel='email', result='ok'), sent + 1)
+        self.assertEqual(self.sample('notification_send_total', channel='telegram', result='ConnectionError'),
+                         failed + 1)
+        self.assertEqual(self.sample('notification_send_seconds_count', channel='email'), timed + 1)
+
+    def test_metrics_endpoint_reports_queue_depth(self):
+        """
+        Проверка, что /metrics отдаёт текстовый формат Prometheus с глубиной очереди.
+        """
+        metrics.queue_depth.reset()
+        enqueue_notification(self.user, 'hello', channels=('email', 'sms'))
+        with override_settings(METRICS_TOKEN='scrape-token'):
+            response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer scrape-token'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('notification_queue_depth{channel="email",status="pending"} 1.0', body)
+        self.assertIn('# TYPE notification_send_seconds histogram', body)
+
+    def test_metrics_endpoint_requires_access(self):
+        """
+        Проверка, что /metrics закрыт для анонимных запросов и открыт staff, по токену и с разрешённых адресов.
+        """
+        url = reverse('metrics')
+        with override_settings(METRICS_TOKEN='scrape-token', METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.5').status_code, 200)
+        staff = User.objects.create_user(username='staff', password='testpassword', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_queue_depth_is_cached_between_scrapes(self):
+        """
+        Проверка, что глубина очереди пересчитывается не чаще раза в METRICS_QUEUE_DEPTH_TTL секунд.
+        """
+        clock = [0.0]
+        collector = metrics.QueueDepthCollector(clock=lambda: clock[0])
+        enqueue_notification(self.user, 'hello', channels=('email',))
+        with self.assertNumQueries(1):
+            self.assertEqual(collector.rows(), [('email', 'pending', 1)])
+            self.assertEqual(collector.rows(), [('email', 'pending', 1)])
+        clock[0] += settings.METRICS_QUEUE_DEPTH_TTL
+        enqueue_notification(self.user, 'again', channels=('email',))
+        self.assertEqual(collector.rows(), [('email', 'pending', 2)])
+
+
+class DatabaseConfigTestCase(TestCase):
+    """
+    Тесты настроек базы данных по окружению.
+    """
+
+    def test_postgresql_keeps_connections_with_health_checks(self):
+        """
+        Проверка, что DB_ENGINE=postgresql даёт постоянные соединения с проверкой перед использованием.
+        """
+        db = load_config({'DB_ENGINE': 'postgresql', 'DB_NAME': 'notify', 'DB_CONN_MAX_AGE': '300'}).database
+        settings_dict = database_settings(db, settings.BASE_DIR)
+        self.assertEqual(settings_dict['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((settings_dict['NAME'], settings_dict['CONN_MAX_AGE']), ('notify', 300))
+        self.assertTrue(settings_dict['CONN_HEALTH_CHECKS'])
+        self.assertEqual(load_config({'DB_ENGINE': 'mysql'}).invalid()[0][0], 'DB_ENGINE')
+
+    def test_sqlite_connection_uses_wal_and_immediate_transactions(self):
+        """
+        Проверка, что соединение SQLite включает WAL, а транзакция сразу берёт блокировку записи.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            settings_dict = database_settings(load_config({}).database, Path(tmp))
+            path = settings_dict['NAME']
+            wrapper = SqliteWrapper({**settings_dict, 'TIME_ZONE': None, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False,
+                                     'TEST': {}})
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+                other = sqlite3.connect(path, timeout=0)
+                with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+                    other.execute('BEGIN IMMEDIATE')
+                other.close()
+                wrapper.rollback()
+            finally:
+                wrapper.close()
+
+
+class ProviderConfigTestCase(TestCase):
+    """
+    Тесты конфигурации провайдеров и её проверки при запуске.
+    """
+
+    ENV = {
+        'DJANGO_SECRET_KEY': 'secret', 'DOMAIN': 'example.com',
+        'EMAIL_HOST_USER': 'bot@example.com', 'EMAIL_HOST_PASSWORD': 'password',
+        'TWILIO_ACCOUNT_SID': 'AC123', 'TWILIO_AUTH_TOKEN': 'token', 'TWILIO_PHONE_NUMBER': '+15005550006',
+        'TELEGRAM_BOT_TOKEN': '123456:' + 'A' * 35, 'TELEGRAM_BOT_NAME': 'test_bot',
+    }
+
+    def test_load_reads_environment_once_into_typed_config(self):
+        """
+        Проверка, что конфигурация собирается из окружения в вложенные секции без пропусков.
+        """
+        config = load_config(self.ENV)
+        self.assertEqual(config.twilio.phone_number, '+15005550006')
+        self.assertEqual(config.telegram.bot_name, 'test_bot')
+        self.assertEqual(config.missing(), [])
+        self.assertEqual(config.invalid(), [])
+
+    def test_check_reports_missing_and_invalid_keys(self):
+        """
+        Проверка, что системная проверка сообщает о пропущенных и некорректных ключах.
+        """
+        env = {**self.ENV, 'TWILIO_AUTH_TOKEN': '', 'TELEGRAM_BOT_TOKEN': 'oops'}
+        with override_settings(CONFIG=load_config(env)):
+            messages = check_provider_config(None)
+        self.assertEqual([message.id for message in messages], ['main_app.W001', 'main_app.W002'])
+        self.assertIn('TWILIO_AUTH_TOKEN', messages[0].msg)
+        self.assertIn('TELEGRAM_BOT_TOKEN', messages[1].msg)
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET='webhook-secret', TELEGRAM_BOT_TOKEN='123:abc')
+class TelegramWebhookTestCase(TestCase):
+    """
+    Тесты webhook Telegram: проверка секрета и передача /start обработчику бота.
+    """
+
+    def post_update(self, text, secret='webhook-secret'):
+        update = {
+            'update_id': 1,
+            'message': {
+                'message_id': 1, 'date': 0, 'text': text,
+                'chat': {'id': 555, 'type': 'private'},
+                'from': {'id': 555, 'is_bot': False, 'first_name': 'Test', 'username': 'tguser'},
+            },
+        }
+        return self.client.post(reverse('telegram_webhook'), data=json.dumps(update),
+                                content_type='application/json',
+                                HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=secret)
+
+    def test_rejects_wrong_secret(self):
+        """
+        Проверка, что обновления с неверным секретом отклоняются.
+        """
+        self.assertEqual(self.post_update('/start abc', secret='wrong').status_code, 403)
+        self.assertFalse(User.objects.filter(telegram_id=555).exists())
+
+    def test_start_update_logs_user_in(self):
+        """
+        Проверка, что /start с токеном из webhook создаёт пользователя с этим токеном.
+        """
+        logins = REGISTRY.get_sample_value('bot_start_total', {'bot': 'sync', 'result': 'login'}) or 0
+        bot = get_bot()
+        with patch.object(bot, 'send_message') as mock_send:
+            response = self.post_update('/start abc')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.filter(telegram_id=555, token='abc').exists())
+        mock_send.assert_called_once()
+        self.assertEqual(REGISTRY.get_sample_value('bot_start_total', {'bot': 'sync', 'result': 'login'}),
+                         logins + 1)
+
+    def test_handler_error_reaches_view(self):
+        """
+        Проверка, что бот обрабатывает обновление в потоке запроса
+        и ошибка обработчика не теряется в пуле потоков.
+        """
+        self.assertFalse(get_bot().threaded)
+        with patch('apps.main_app.bot.login', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.post_update('/start abc')
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='123:abc')  # тестам нужен синхронный бот
+class LazyBotTestCase(TestCase):
+    """
+    Тесты отложенного создания Telegram-бота.
+    """
+
+    def test_web_process_does_not_build_bot(self):
+        """
+        Проверка, что импорт представлений и очереди уведомлений и выбор доступных каналов
+        не создают бота и не грузят клиенты провайдеров.
+        """
+        code = ('import django, sys; django.setup(); '
+                'from django.urls import get_resolver; get_resolver().url_patterns; '
+                'from apps.main_app.notifications import reachable_channels; '
+                'from apps.users_app.models import User; '
+                'assert reachable_channels(User(email="a@example.com", can_email=True)) == ["email"]; '
+                'print(*(name in sys.modules for name in ("apps.main_app.bot", "telebot", "aiohttp", "twilio.rest")))')
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='core.settings')
+        output = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.split(), ['False', 'False', 'False', 'False'])
+
+    def test_get_bot_is_shared(self):
+        """
+        Проверка, что бот создаётся один раз на процесс и с обработчиком /start.
+        """
+        self.assertIs(get_bot(), get_bot())
+        self.assertEqual(len(get_bot().message_handlers), 1)
+
+
+class AsyncBotTestCase(TransactionTestCase):
+    """
+    Тесты асинхронного обработчика /start.
+    """
+
+    def make_message(self, text):
+        return Mock(text=text, chat=Mock(id=777), from_user=Mock(username='tguser'))
+
+    def test_start_with_token_logs_user_in(self):
+        """
+        Проверка, что /start с токеном сохраняет пользователя и отвечает об успешном входе.
+        """
+        bot = Mock(send_message=AsyncMock())
+        self.assertEqual(asyncio.run(handle_start(bot, self.make_message('/start abc'))), 'login')
+        self.assertTrue(User.objects.filter(telegram_id=777, token='abc').exists())
+        self.assertEqual(bot.send_message.await_args.args, (777, 'Вход выполнен успешно'))
+
+    def test_start_without_token_asks_to_use_site(self):
+        """
+        Проверка, что /start без токена не создаёт пользователя.
+        """
+        bot = Mock(send_message=AsyncMock())
+        self.assertEqual(asyncio.run(handle_start(bot, self.make_message('/start'))), 'no_token')
+        self.assertFalse(User.objects.exists())
+        bot.send_message.assert_awaited_once()
+
+
+class AsyncNotificationViewsTestCase(TestCase):
+    """
+    Тесты асинхронных представлений отправки уведомлений.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword', telegram_id=123)
+
+    def test_async_view_requires_login(self):
+        """
+        Проверка, что асинхронное представление перенаправляет неаутентифицированного пользователя.
+        """
+        url = reverse('main_app:async_send_tg')
+        response = self.client.get(url)
+        self.assertRedirects(response, f"{reverse('users_app:login')}?next={url}", fetch_redirect_response=False)
+
+    def test_async_view_delivers_without_queue(self):
+        """
+        Проверка, что асинхронное представление сразу отправляет сообщение и сохраняет статус.
+        """
+        mock_telegram = AsyncMock(return_value=7)
+        self.client.login(username='testuser', password='testpassword')
+        with patch.object(get_backend('telegram'), 'asend', mock_telegram):
+            response = self.client.get(reverse('main_app:async_send_tg'))
+        self.assertEqual(response.status_code, 200)
+        mock_telegram.assert_awaited_once()
+        deliveries = Notification.objects.get().delivery_map()
+        self.assertEqual(set(deliveries), {'telegram'})
+        self.assertEqual(deliveries['telegram'].status, DeliveryStatus.SENT)
+        self.assertEqual(deliveries['telegram'].provider_message_id, '7')
+
+
+class NotificationHistoryTestCase(TestCase):
+    """
+    Тесты истории уведомлений и keyset-пагинации.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='testpassword')
+        cls.staff = User.objects.create_user(username='staff', password='testpassword', is_staff=True,
+                                             email='staff@example.com')
+        message = Message.for_body('hello')
+        Notification.objects.bulk_create([Notification(user=cls.user, message=message) for _ in range(25)])
+        enqueue_notification(cls.staff, 'staff', channels=('email',))
+
+    def test_keyset_pages_cover_all_rows_once(self):
+        """
+        Проверка, что страницы по курсору проходят все записи ровно один раз, от новых к старым.
+        """
+        queryset = Notification.objects.filter(user=self.user)
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_page(queryset, cursor, size=10)
+            seen += [notification.id for notification in page]
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(queryset.order_by('-date_add', '-id').values_list('id', flat=True)))
+
+    def test_history_page_shows_only_own_notifications(self):
+        """
+        Проверка, что страница истории показывает только уведомления текущего пользователя.
+        """
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('main_app:history'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['notifications']), 20)
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertNotIn('staff', [n.message.body for n in response.context['notifications']])
+        self.assertEqual(self.client.get(reverse('main_app:history'), {'cursor': '%%%'}).status_code, 400)
+
+    def test_api_filters_by_channel_status(self):
+        """
+        Проверка, что JSON-API для staff фильтрует по статусу канала.
+        """
+        self.client.login(username='staff', password='testpassword')
+        response = self.client.get(reverse('main_app:notifications_api'), {'channel': 'email', 'status': 'pending'})
+        data = response.json()
+        self.assertEqual([item['message'] for item in data['results']], ['staff'])
+        self.assertEqual(data['results'][0]['deliveries']['email']['status'], 'pending')
+        self.assertIsNone(data['next'])
+
+    def test_api_rejects_bad_user(self):
+        """
+        Проверка, что нечисловой ?user= даёт ответ 400, а не ошибку сервера.
+        """
+        self.client.login(username='staff', password='testpassword')
+        response = self.client.get(reverse('main_app:notifications_api'), {'user': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+
+class SchedulerTestCase(TestCase):
+    """
+    Тесты отложенных уведомлений и планировщика.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword',
+                                             email='test@example.com', phone_number='+79990000000')
+        self.clock = [datetime(2026, 1, 1, 12, 0, tzinfo=dt_timezone.utc)]
+
+    def make_scheduler(self, **kwargs):
+        return Scheduler(now=lambda: self.clock[0], **kwargs)
+
+    def test_due_notification_is_enqueued_once(self):
+        """
+        Проверка, что запись ставится в очередь в свой срок и удаляется, а планировщик спит до срока.
+        """
+        schedule(self.user, 'hello', due_at=self.clock[0] + timedelta(minutes=15), channels=('email', 'sms'))
+        scheduler = self.make_scheduler()
+        self.assertEqual(scheduler.tick(), 0)
+        self.assertEqual(scheduler.wait_time(), 30)  # раньше срока — только перечитывание
+        self.clock[0] += timedelta(minutes=15)
+        self.assertEqual(scheduler.tick(), 1)
+        self.assertEqual(Delivery.objects.pending().count(), 2)
+        self.assertFalse(ScheduledNotification.objects.exists())
+        self.assertEqual(scheduler.tick(), 0)
+
+    def test_unknown_channel_does_not_block_batch(self):
+        """
+        Проверка, что канал, убранный из NOTIFICATION_CHANNELS после планирования, пропускается,
+        а пачка ставится в очередь.
+        """
+        schedule(self.user, 'hello', due_at=self.clock[0], channels=('email', 'pager'))
+        schedule(self.user, 'hello', due_at=self.clock[0], channels=('email',))
+        self.assertEqual(self.make_scheduler().tick(), 2)
+        self.assertEqual(list(Delivery.objects.values_list('channel', flat=True)), ['email', 'email'])
+        self.assertFalse(ScheduledNotification.objects.exists())
+
+    def test_wakes_at_next_due_time(self):
+        """
+        Проверка, что планировщик просыпается к ближайшему сроку из кучи, а не по опросу таблицы.
+        """
+        schedule(self.user, 'hello', due_at=self.clock[0] + timedelta(seconds=5))
+        scheduler = self.make_scheduler()
+        scheduler.tick()
+        self.assertEqual(scheduler.wait_time(), 5)
+        with self.assertNumQueries(0):
+            scheduler.run_due()
+
+    def test_recurring_notification_skips_missed_periods(self):
+        """
+        Проверка, что регулярная запись переносится на ближайший будущий срок без отправки пропущенных.
+        """
+        item = schedule(self.user, 'digest', due_at=self.clock[0] - timedelta(days=3, hours=1),
+                        interval=timedelta(days=1))
+        self.assertEqual(self.make_scheduler().tick(), 1)
+        item.refresh_from_db()
+        self.assertEqual(item.due_at, self.clock[0] + timedelta(hours=23))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_prefetch_limit_drains_in_batches(self):
+        """
+        Проверка, что записей больше prefetch с одним сроком отправляются за несколько чтений.
+        """
+        for _ in range(5):
+            schedule(self.user, 'hello', due_at=self.clock[0])
+        scheduler = self.make_scheduler(prefetch=2, batch_size=1)
+        fired = [scheduler.tick() for _ in range(4)]
+        self.assertEqual(fired, [2, 2, 1, 0])
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_next_local_time_uses_time_zone(self):
+        """
+        Проверка, что «в 09:00» считается по TIME_ZONE и переносится на завтра, если время прошло.
+        """
+        due_at = next_local_time(9, now=self.clock[0])  # 12:00 UTC = 17:00 в Екатеринбурге
+        self.assertEqual(due_at.astimezone(dt_timezone.utc), datetime(2026, 1, 2, 4, 0, tzinfo=dt_timezone.utc))
@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from email.utils import make_msgid
+from smtplib import SMTPRecipientsRefused, SMTPResponseException, SMTPServerDisconnected
+import asyncio
+import threading
+import time
+
+
+class EmailSession:
+    '''
+    Постоянное SMTP-соединение для отправки писем.
+    Одно соединение (STARTTLS + логин) переиспользуется для многих писем.
+    Соединение переоткрывается, если простаивало дольше idle_timeout секунд,
+    если через него отправлено max_messages писем или если сервер его закрыл.
+    SMTP-соединение нельзя использовать из нескольких потоков одновременно,
+    поэтому отправка идёт под блокировкой.
+    '''
+
+    def __init__(self, idle_timeout=None, max_messages=None):
+        self.idle_timeout = idle_timeout if idle_timeout is not None else settings.EMAIL_IDLE_TIMEOUT
+        self.max_messages = max_messages or settings.EMAIL_MAX_MESSAGES_PER_CONNECTION
+        self._lock = threading.Lock()
+        self._connection = None
+        self._sent = 0  # писем через текущее соединение
+        self._last_used = 0.0
+
+    def send_messages(self, messages):
+        '''
+        Отправка списка EmailMessage через постоянное соединение.
+
+        :param messages: Список писем.
+        :return: Количество отправленных писем.
+        '''
+        sent = delivered = 0
+        with self._lock:
+            while sent < len(messages):
+                connection = self._get_connection()
+                chunk = messages[sent:sent + self.max_messages - self._sent]
+                delivered += self._send(connection, chunk)
+                sent += len(chunk)
+        return delivered
+
+    def send_each(self, messages):
+        '''
+        Отправка писем по одному через постоянное соединение.
+        Ошибка одного письма не прерывает остальные: письма до неё уже приняты сервером,
+        и повторять их нельзя.
+
+        :param messages: Список писем.
+        :return: Список той же длины: None для принятого письма или исключение.
+        '''
+        results = []
+        with self._lock:
+            for message in messages:
+                try:
+                    self._send(self._get_connection(), [message])
+                    results.append(None)
+                except (SMTPRecipientsRefused, SMTPResponseException) as e:
+                    results.append(e)  # сервер отказал в письме, соединение остаётся рабочим
+                except Exception as e:
+                    self._close()  # состояние соединения неизвестно, следующее письмо откроет новое
+                    results.append(e)
+        return results
+
+    def _send(self, connection, chunk):
+        try:
+            delivered = connection.send_messages(chunk) or 0
+        except SMTPServerDisconnected:
+            # Сервер закрыл соединение (например, по таймауту) — переподключаемся один раз.
+            self._close()
+            delivered = self._get_connection().send_messages(chunk) or 0
+        self._sent += len(chunk)
+        self._last_used = time.monotonic()
+        return delivered
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _get_connection(self):
+        idle = time.monotonic() - self._last_used
+        if self._connection is not None and (idle > self.idle_timeout or self._sent >= self.max_messages):
+            self._close()
+        if self._connection is None:
+            self._connection = get_connection(fail_silently=False, timeout=settings.NOTIFICATION_CHANNEL_TIMEOUT)
+            self._connection.open()
+            self._sent = 0
+        return self._connection
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    ''' Общая SMTP-сессия на весь процесс. '''
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = EmailSession()
+    return _session
+
+
+def build_message(to, body, subject='Notification'):
+    return EmailMessage(subject=subject, body=body, to=[to], headers={'Message-ID': make_msgid()})
+
+
+def send_email(to, body, subject='Notification'):
+    '''
+    Отправка одного письма через общую SMTP-сессию.
+
+    :param to: Адрес получателя.
+    :param body: Текст письма.
+    :param subject: Тема письма.
+    :return: Message-ID письма.
+    '''
+    message = build_message(to, body, subject)
+    get_session().send_messages([message])
+    return message.extra_headers['Message-ID']
+
+
+async def asend_email(to, body, subject='Notification'):
+    '''
+    Асинхронная отправка письма: SMTP блокирующий, поэтому отправка идёт
+    через общую SMTP-сессию в отдельном потоке.
+    '''
+    return await asyncio.to_thread(send_email, to, body, subject)
+
+
+def send_many(pairs, subject='Notification'):
+    '''
+    Отправка многих писем за одну SMTP-сессию.
+
+    :param pairs: Пары (адрес, текст).
+    :return: Количество отправленных писем.
+    '''
+    return get_session().send_messages([build_message(to, body, subject) for to, body in pairs])
@@ -0,0 +1,70 @@
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client as TwilioClient
+import asyncio
+import threading
+import weakref
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> асинхронный клиент Twilio
+
+
+def get_client():
+    '''
+    Общий клиент Twilio на весь процесс.
+    Создаётся один раз при первой отправке и переиспользуется всеми потоками:
+    HTTP-сессия держит keep-alive соединения в пуле размером TWILIO_POOL_SIZE.
+    '''
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+def _build_client():
+    http_client = TwilioHttpClient(pool_connections=True, timeout=settings.NOTIFICATION_CHANNEL_TIMEOUT)
+    http_client.session.mount('https://', HTTPAdapter(pool_connections=1,
+                                                      pool_maxsize=settings.TWILIO_POOL_SIZE))
+    return _make_client(http_client)
+
+
+def _make_client(http_client):
+    client = TwilioClient(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+    if settings.TWILIO_API_URL:
+        client.api.base_url = settings.TWILIO_API_URL  # заглушка API для замеров
+    return client
+
+
+def send_sms(to, body):
+    '''
+    Отправка СМС через общий клиент Twilio.
+
+    :param to: Номер получателя.
+    :param body: Текст сообщения.
+    :return: Объект сообщения Twilio.
+    '''
+    return get_client().messages.create(body=body, from_=settings.TWILIO_PHONE_NUMBER, to=str(to))
+
+
+def get_async_client():
+    '''
+    Асинхронный клиент Twilio (aiohttp) для текущего event loop.
+    Сессия aiohttp привязана к циклу, поэтому клиент создаётся по одному на цикл.
+    '''
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        from twilio.http.async_http_client import AsyncTwilioHttpClient  # aiohttp грузится только для async
+        http_client = AsyncTwilioHttpClient(timeout=settings.NOTIFICATION_CHANNEL_TIMEOUT)
+        client = _async_clients[loop] = _make_client(http_client)
+    return client
+
+
+async def asend_sms(to, body):
+    ''' Асинхронная отправка СМС, не блокирует event loop. '''
+    return await get_async_client().messages.create_async(body=body, from_=settings.TWILIO_PHONE_NUMBER,
+                                                          to=str(to))
@@ -0,0 +1,248 @@
+from collections import deque
+from django.conf import settings
+from telebot import apihelper
+from telebot.apihelper import ApiTelegramException
+from ..bot import get_bot
+from loguru import logger
+import asyncio
+import threading
+import time
+import weakref
+
+API_URL = 'https://api.telegram.org/bot{0}/{1}'  # если не задан apihelper.API_URL (локальный Bot API)
+
+
+class TokenBucket:
+    '''
+    Ведро токенов: rate токенов в секунду, не больше capacity про запас.
+    '''
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        ''' Сколько секунд ждать до появления целого токена (после refill). '''
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def is_full(self):
+        return self.tokens >= self.capacity
+
+
+class TelegramScheduler:
+    '''
+    Планировщик отправки сообщений в Telegram с учётом лимитов API:
+    общий лимит на бота (~30 сообщений/сек) и лимит на чат (~1 сообщение/сек).
+    Лишние отправки ждут своей очереди, а не получают 429.
+    Если Telegram всё же ответил 429, отправка ставится на паузу на retry_after секунд
+    и повторяется до max_retries раз. Синхронная (send_message) и асинхронная
+    (asend_message) отправка делят одни и те же вёдра и паузу.
+    '''
+
+    MAX_IDLE_CHATS = 10000  # после скольких вёдер чатов удалять простаивающие
+
+    def __init__(self, bot=None, global_rate=None, chat_rate=None, max_retries=3,
+                 clock=time.monotonic):
+        self._bot = bot
+        self.global_rate = global_rate or settings.TELEGRAM_GLOBAL_RATE
+        self.chat_rate = chat_rate or settings.TELEGRAM_CHAT_RATE
+        self.max_retries = max_retries
+        self.timeout = settings.NOTIFICATION_CHANNEL_TIMEOUT  # таймаут HTTP-запроса к Bot API
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._global = TokenBucket(self.global_rate, self.global_rate, clock())
+        self._chats = {}  # chat_id -> TokenBucket
+        self._paused_until = 0.0  # пауза после ответа 429
+        self._sent = deque()  # время последних отправок для подсчёта скорости
+        self._waiting = 0
+
+    @property
+    def bot(self):
+        ''' Бот синхронной отправки, по умолчанию общий бот процесса: асинхронной отправке он не нужен. '''
+        return self._bot or get_bot()
+
+    def send_message(self, chat_id, text, **kwargs):
+        '''
+        Отправка сообщения с ожиданием свободного токена.
+        Аргументы как у bot.send_message.
+        '''
+        for attempt in range(self.max_retries + 1):
+            self._acquire(chat_id)
+            try:
+                result = self.bot.send_message(chat_id, text, **{'timeout': self.timeout, **kwargs})
+            except ApiTelegramException as e:
+                if not self._pause(e, attempt):
+                    raise
+                continue
+            self._record_sent()
+            return result
+
+    async def asend_message(self, chat_id, text):
+        '''
+        Асинхронная отправка сообщения через aiohttp с теми же вёдрами токенов,
+        что и у send_message: лимиты общие для потоков воркера и event loop.
+        Свободный токен ожидается через asyncio.sleep, поток не блокируется.
+        '''
+        for attempt in range(self.max_retries + 1):
+            await self._aacquire(chat_id)
+            try:
+                result = await _apost(chat_id, text)
+            except ApiTelegramException as e:
+                if not self._pause(e, attempt):
+                    raise
+                continue
+            self._record_sent()
+            return result
+
+    def throughput(self, window=10.0):
+        ''' Текущая скорость отправки, сообщений в секунду за последние window секунд. '''
+        with self._cond:
+            self._trim_sent(self.clock() - window)
+            return len(self._sent) / window
+
+    def stats(self):
+        ''' Скорость отправки и число отправок, ожидающих своей очереди. '''
+        return {'throughput': self.throughput(), 'waiting': self._waiting}
+
+    def _pause(self, error, attempt):
+        '''
+        Пауза на retry_after секунд после ответа 429.
+
+        :return: Повторять ли отправку; False — ошибку нужно поднять.
+        '''
+        if error.error_code != 429 or attempt == self.max_retries:
+            return False
+        retry_after = error.result_json.get('parameters', {}).get('retry_after', 1)
+        logger.warning(f'\nTELEGRAM 429: пауза {retry_after} сек.')
+        with self._cond:
+            self._paused_until = max(self._paused_until, self.clock() + retry_after)
+        return True
+
+    def _acquire(self, chat_id):
+        with self._cond:
+            self._waiting += 1
+            try:
+                while (wait := self._reserve(chat_id)) > 0:
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+
+    async def _aacquire(self, chat_id):
+        with self._cond:
+            self._waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._reserve(chat_id)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+    def _reserve(self, chat_id):
+        '''
+        Списание токенов из общего ведра и ведра чата (под self._cond).
+
+        :return: 0, если токены списаны, иначе сколько секунд ждать.
+        '''
+        now = self.clock()
+        chat = self._chat_bucket(chat_id, now)
+        self._global.refill(now)
+        chat.refill(now)
+        wait = max(self._paused_until - now, self._global.wait_time(), chat.wait_time())
+        if wait > 0:
+            return wait
+        self._global.tokens -= 1
+        chat.tokens -= 1
+        return 0
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_IDLE_CHATS:
+                self._drop_idle_chats(now)
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, 1, now)
+        return bucket
+
+    def _drop_idle_chats(self, now):
+        for chat_id, bucket in list(self._chats.items()):
+            bucket.refill(now)
+            if bucket.is_full():
+                del self._chats[chat_id]
+
+    def _record_sent(self):
+        with self._cond:
+            now = self.clock()
+            self._sent.append(now)
+            self._trim_sent(now - 60)
+
+    def _trim_sent(self, since):
+        while self._sent and self._sent[0] < since:
+            self._sent.popleft()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    ''' Общий планировщик отправки в Telegram процесса. '''
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = TelegramScheduler()
+    return _scheduler
+
+
+def scheduler_stats():
+    '''
+    Статистика общего планировщика, если он уже создан.
+    Воркер без доставок в Telegram не создаёт ради неё бота.
+    '''
+    return _scheduler.stats() if _scheduler is not None else {}
+
+
+def send_message(chat_id, text, **kwargs):
+    ''' Отправка сообщения в Telegram через общий планировщик. '''
+    return get_scheduler().send_message(chat_id, text, **kwargs)
+
+
+_sessions = weakref.WeakKeyDictionary()  # event loop -> aiohttp-сессия
+
+
+def _get_session():
+    ''' Общая aiohttp-сессия (keep-alive к api.telegram.org) для текущего event loop. '''
+    import aiohttp  # нужен только асинхронной отправке, не грузится при старте процесса
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        timeout = aiohttp.ClientTimeout(total=settings.NOTIFICATION_CHANNEL_TIMEOUT)
+        session = _sessions[loop] = aiohttp.ClientSession(timeout=timeout)
+    return session
+
+
+async def asend_message(chat_id, text):
+    ''' Асинхронная отправка сообщения в Telegram через общий планировщик. '''
+    return await get_scheduler().asend_message(chat_id, text)
+
+
+async def _apost(chat_id, text):
+    '''
+    Запрос sendMessage напрямую в Bot API через aiohttp.
+    Ошибки API поднимаются как ApiTelegramException, как у синхронного бота.
+    '''
+    async with _get_session().post((apihelper.API_URL or API_URL).format(settings.TELEGRAM_BOT_TOKEN, 'sendMessage'),
+                                   json={'chat_id': chat_id, 'text': text}) as response:
+        result = await response.json()
+    if not result.get('ok'):
+        raise ApiTelegramException('sendMessage', response, result)
+    return result['result']
@@ -8,4 +8,11 @@ urlpatterns = [
     path('send_email', views.email_notification, name='send_email'),    # отправка уведомлений Email
     path('send_tg', views.telegram_notification, name='send_tg'),   # отправка уведомлений Телеграм
     path('send_sms', views.sms_notification, name='send_sms'),# отправка уведомлений СМС
+    path('async/send_notification', views.anotify_user, name='async_send_notification'),  # асинхронно СМС+Емейл+ТГ
+    path('async/send_email', views.aemail_notification, name='async_send_email'),  # асинхронно Email
+    path('async/send_tg', views.atelegram_notification, name='async_send_tg'),  # асинхронно Телеграм
+    path('async/send_sms', views.asms_notification, name='async_send_sms'),  # асинхронно СМС
+    path('history', views.history, name='history'),  # история уведомлений пользователя
+    path('api/notifications', views.notifications_api, name='notifications_api'),  # история для staff (JSON)
+    path('broadcast', views.broadcast_view, name='broadcast'),  # массовая рассылка (staff)
 ]
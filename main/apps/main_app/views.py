@@ -1,7 +1,21 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, HttpResponse
-from .notifications import send_all_notification, send_telegram_notification, send_email_notification, send_sms_notification
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from prometheus_client import CONTENT_TYPE_LATEST
+from .broadcast import broadcast, get_audience
+from .decorators import alogin_required
+from .forms import BroadcastForm
+from . import metrics
+from .models import Notification, DeliveryStatus
+from .notifications import CHANNELS, adeliver_notification, enqueue_once
+from .pagination import keyset_page
+import hmac
+import json
 
 
 @login_required()
@@ -15,53 +29,271 @@ def index(request: HttpRequest) -> HttpResponse:
     return render(request, 'main_app/index.html')
 
 
+def _enqueue(request: HttpRequest, message: str, channels) -> HttpResponse:
+    """
+    Ставит уведомление в очередь один раз на ключ идемпотентности.
+    Ключ берётся из заголовка Idempotency-Key или выводится из пользователя, текста и окна времени,
+    повторный запрос показывает статус уже созданного уведомления вместо новой отправки.
+
+    :param request: Объект запроса.
+    :param message: Текст сообщения.
+    :param channels: Каналы доставки.
+    :return: Рендеринг страницы 'main_app/index.html'.
+    """
+    notification, created = enqueue_once(request.user, message, channels=channels,
+                                         key=request.headers.get('Idempotency-Key'))
+    return render(request, 'main_app/index.html', _result_context(notification, created))
+
+
+def _result_context(notification, created) -> dict:
+    """
+    Контекст страницы с результатом постановки в очередь.
+    Если ни один канал пользователю не доступен, уведомление не создаётся, и страница предлагает заполнить профиль.
+    """
+    if notification is None:
+        return {'unreachable': True}
+    return {'notification': notification, 'duplicate': not created}
+
+
 @login_required
 def notify_user(request: HttpRequest) -> HttpResponse:
     """
-    Отправляет все уведомления пользователю.
+    Ставит в очередь все уведомления пользователю.
+    Отправку выполняет воркер `send_notifications`.
 
     :param request: Объект запроса.
     :return: Рендеринг страницы 'main_app/index.html'.
     """
     message = "This is a test notification!"
-    send_all_notification(request.user, message)
-    return render(request, 'main_app/index.html')
+    return _enqueue(request, message, CHANNELS)
 
 
 @login_required()
 def sms_notification(request: HttpRequest) -> HttpResponse:
     """
-    Отправляет SMS-уведомление пользователю.
+    Ставит в очередь SMS-уведомление пользователю.
 
     :param request: Объект запроса.
     :return: Рендеринг страницы 'main_app/index.html'.
     """
     message = "Это тестовое сообщение написано специально для вас!"
-    send_sms_notification(request.user, message)
-    return render(request, 'main_app/index.html')
+    return _enqueue(request, message, ('sms',))
 
 
 @login_required()
 def email_notification(request: HttpRequest) -> HttpResponse:
     """
-    Отправляет email-уведомление пользователю.
+    Ставит в очередь email-уведомление пользователю.
 
     :param request: Объект запроса.
     :return: Рендеринг страницы 'main_app/index.html'.
     """
     message = "Это тестовое сообщение написано специально для вас!"
-    send_email_notification(request.user, message)
-    return render(request, 'main_app/index.html')
+    return _enqueue(request, message, ('email',))
 
 
 @login_required()
 def telegram_notification(request: HttpRequest) -> HttpResponse:
     """
-    Отправляет Telegram-уведомление пользователю.
+    Ставит в очередь Telegram-уведомление пользователю.
 
     :param request: Объект запроса.
     :return: Рендеринг страницы 'main_app/index.html'.
     """
     message = "Это тестовое сообщение написано специально для вас!"
-    send_telegram_notification(request.user, message)
-    return render(request, 'main_app/index.html')
\ No newline at end of file
+    return _enqueue(request, message, ('telegram',))
+
+
+@login_required()
+def history(request: HttpRequest) -> HttpResponse:
+    """
+    Отображает историю уведомлений пользователя, от новых к старым.
+    Страницы листаются по курсору (?cursor=...), а не по номеру страницы.
+
+    :param request: Объект запроса.
+    :return: Рендеринг страницы 'main_app/history.html'.
+    """
+    try:
+        notifications, next_cursor = keyset_page(
+            Notification.objects.filter(user=request.user).select_related('message').prefetch_related('deliveries'),
+            request.GET.get('cursor'))
+    except ValueError:
+        return HttpResponseBadRequest('Неверный курсор')
+    context = {'notifications': notifications, 'next_cursor': next_cursor}
+    return render(request, 'main_app/history.html', context)
+
+
+@staff_member_required
+def notifications_api(request: HttpRequest) -> JsonResponse:
+    """
+    JSON-история уведомлений для сотрудников (staff).
+
+    Фильтры: ?user=<id>, ?channel=<email|sms|telegram>&status=<статус>.
+    Страницы листаются по курсору из поля "next".
+
+    :param request: Объект запроса.
+    :return: JSON со списком уведомлений и курсором следующей страницы.
+    """
+    notifications = Notification.objects.select_related('message').prefetch_related('deliveries')
+    if request.GET.get('user'):
+        if not request.GET['user'].isdigit():
+            return JsonResponse({'error': 'user должен быть id пользователя'}, status=400)
+        notifications = notifications.filter(user_id=request.GET['user'])
+    channel, status = request.GET.get('channel'), request.GET.get('status')
+    if channel or status:
+        if channel not in CHANNELS or status not in DeliveryStatus.values:
+            return JsonResponse({'error': 'Укажите channel и status вместе'}, status=400)
+        notifications = notifications.filter(deliveries__channel=channel, deliveries__status=status)
+    try:
+        page, next_cursor = keyset_page(notifications, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'error': 'Неверный курсор'}, status=400)
+    results = [{
+        'id': notification.id,
+        'user': notification.user_id,
+        'message': notification.message.body,
+        'date_add': notification.date_add.isoformat(),
+        'deliveries': {delivery.channel: {
+            'status': delivery.status,
+            'attempts': delivery.attempts,
+            'error': delivery.last_error,
+            'next_attempt_at': delivery.next_attempt_at and delivery.next_attempt_at.isoformat(),
+            'sent_at': delivery.sent_at and delivery.sent_at.isoformat(),
+        } for delivery in notification.deliveries.all()},
+    } for notification in page]
+    return JsonResponse({'results': results, 'next': next_cursor})
+
+
+async def _anotify(request: HttpRequest, message: str, channels) -> HttpResponse:
+    """
+    Асинхронно отправляет уведомление пользователю без очереди и без блокировки потока.
+    Повторный запрос с тем же ключом идемпотентности не отправляет уведомление ещё раз.
+
+    :param request: Объект запроса.
+    :param message: Текст сообщения.
+    :param channels: Каналы доставки.
+    :return: Рендеринг страницы 'main_app/index.html'.
+    """
+    notification, created = await sync_to_async(enqueue_once)(request.user, message, channels=channels,
+                                                              key=request.headers.get('Idempotency-Key'))
+    if created:
+        await adeliver_notification(notification)
+    return render(request, 'main_app/index.html', _result_context(notification, created))
+
+
+@alogin_required
+async def anotify_user(request: HttpRequest) -> HttpResponse:
+    """
+    Асинхронно отправляет все уведомления пользователю.
+
+    :param request: Объект запроса.
+    :return: Рендеринг страницы 'main_app/index.html'.
+    """
+    return await _anotify(request, "This is a test notification!", CHANNELS)
+
+
+@alogin_required
+async def asms_notification(request: HttpRequest) -> HttpResponse:
+    """
+    Асинхронно отправляет SMS-уведомление пользователю.
+
+    :param request: Объект запроса.
+    :return: Рендеринг страницы 'main_app/index.html'.
+    """
+    return await _anotify(request, "Это тестовое сообщение написано специально для вас!", ('sms',))
+
+
+@alogin_required
+async def aemail_notification(request: HttpRequest) -> HttpResponse:
+    """
+    Асинхронно отправляет email-уведомление пользователю.
+
+    :param request: Объект запроса.
+    :return: Рендеринг страницы 'main_app/index.html'.
+    """
+    return await _anotify(request, "Это тестовое сообщение написано специально для вас!", ('email',))
+
+
+@alogin_required
+async def atelegram_notification(request: HttpRequest) -> HttpResponse:
+    """
+    Асинхронно отправляет Telegram-уведомление пользователю.
+
+    :param request: Объект запроса.
+    :return: Рендеринг страницы 'main_app/index.html'.
+    """
+    return await _anotify(request, "Это тестовое сообщение написано специально для вас!", ('telegram',))
+
+
+@staff_member_required
+def broadcast_view(request: HttpRequest) -> HttpResponse:
+    """
+    Массовая рассылка для сотрудников (staff).
+
+    При GET-запросе отображает форму рассылки.
+    При POST-запросе ставит сообщение в очередь для выбранной аудитории.
+
+    :param request: Объект запроса.
+    :return: Рендеринг страницы 'main_app/broadcast.html'.
+    """
+    if request.method != 'POST':
+        form = BroadcastForm()
+        return render(request, 'main_app/broadcast.html', {'form': form})
+
+    form = BroadcastForm(data=request.POST)
+    if not form.is_valid():
+        return render(request, 'main_app/broadcast.html', {'form': form, 'error': True})
+
+    total = broadcast(get_audience(form.cleaned_data['audience']),
+                      form.cleaned_data['message'],
+                      channels=form.cleaned_data['channels'])
+    context = {'form': BroadcastForm(), 'total': total}
+    return render(request, 'main_app/broadcast.html', context)
+
+
+@csrf_exempt
+@require_POST
+def telegram_webhook(request: HttpRequest) -> HttpResponse:
+    """
+    Принимает обновления Telegram (webhook) и передаёт их обработчикам бота.
+
+    Запрос принимается, только если заголовок X-Telegram-Bot-Api-Secret-Token
+    совпадает с TELEGRAM_WEBHOOK_SECRET.
+
+    :param request: Объект запроса с JSON-обновлением в теле.
+    :return: Пустой ответ 200, 400 при некорректном JSON или 403 при неверном секрете.
+    """
+    secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not settings.TELEGRAM_WEBHOOK_SECRET or not hmac.compare_digest(secret, settings.TELEGRAM_WEBHOOK_SECRET):
+        return HttpResponseForbidden()
+    from telebot.types import Update  # telebot грузится только в процессе, который принимает webhook
+    from .bot import get_bot
+    try:
+        update = Update.de_json(json.loads(request.body))
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest()
+    get_bot().process_new_updates([update])
+    return HttpResponse()
+
+
+def _metrics_allowed(request: HttpRequest) -> bool:
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    if settings.METRICS_TOKEN and hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                      f'Bearer {settings.METRICS_TOKEN}'):
+        return True
+    return request.user.is_staff
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Метрики Prometheus: задержки и результаты отправки по каналам,
+    обработка /start ботом (режим webhook) и глубина очереди.
+    Доступны staff, по токену METRICS_TOKEN (Authorization: Bearer) и с адресов METRICS_ALLOWED_IPS.
+
+    :param request: Объект запроса.
+    :return: Метрики в текстовом формате Prometheus или 403.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,83 @@
+'''
+Пул процессов-воркеров доставки на одном узле (send_notifications --workers).
+
+Воркеры не делят очередь заранее: каждый забирает пачки доставок через claim_batch с арендой,
+поэтому процессы одного узла и воркеры разных узлов работают с одной таблицей без координатора.
+Партиции по user_id узла раскладываются по его воркерам (без --partitions — по партиции
+на воркера), и все доставки одного пользователя обрабатывает один воркер.
+
+Процессы запускаются через multiprocessing (spawn) и настраивают Django сами,
+поэтому модуль не импортирует модели на верхнем уровне.
+'''
+import multiprocessing
+import os
+import socket
+
+
+def worker_name():
+    ''' Имя воркера для locked_by: узел и pid процесса. '''
+    return f'{socket.gethostname()}:{os.getpid()}'[:64]
+
+
+def assign(partitions, workers):
+    '''
+    Раскладка партиций узла по воркерам.
+
+    :return: Список партиций для каждого воркера.
+    '''
+    return [list(partitions[index::workers]) for index in range(workers)]
+
+
+def _work(index, options, database, overrides, api_url, quiet):
+    ''' Процесс-воркер: цикл send_notifications со своей долей партиций. '''
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    from django.conf import settings
+    if database is not None:
+        settings.DATABASES['default'] = database
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    django.setup()
+    if api_url:
+        from telebot import apihelper
+        apihelper.API_URL = api_url
+    if quiet:
+        from loguru import logger
+        logger.disable('apps.main_app')
+    from .management.commands.send_notifications import Command
+    Command().work(**{**options, 'index': index})
+
+
+def run_pool(workers, partitions=(), database=None, overrides=None, api_url=None, quiet=False, **options):
+    '''
+    Запуск workers процессов-воркеров и ожидание их завершения.
+
+    Лимиты Telegram действуют на бота, а вёдра токенов у каждого процесса свои, поэтому
+    каждый воркер получает TELEGRAM_GLOBAL_RATE / workers, а очередь без заданных партиций
+    делится на workers партиций по user_id: сообщения в один чат отправляет один воркер.
+
+    :param partitions: Партиции узла (при partition_count в options), делятся между воркерами.
+    :param database: Настройки DATABASES['default'] для процессов, по умолчанию из settings.
+    :param overrides: Настройки, которые процессы меняют перед запуском (заглушки провайдеров в замерах).
+    :param api_url: apihelper.API_URL для Telegram (заглушка в замерах).
+    :param quiet: Выключить лог доставки в процессах.
+    :param options: Параметры Command.work: batch_size, interval, once, metrics_port, lease, partition_count.
+    '''
+    from django.conf import settings
+    if not options.get('partition_count'):
+        options['partition_count'], partitions = workers, range(workers)
+    overrides = {**(overrides or {})}
+    overrides['TELEGRAM_GLOBAL_RATE'] = overrides.get('TELEGRAM_GLOBAL_RATE', settings.TELEGRAM_GLOBAL_RATE) / workers
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_work, name=f'notification-worker-{index}',
+                                 args=(index, {**options, 'partitions': share}, database,
+                                       overrides, api_url, quiet))
+                 for index, share in enumerate(assign(partitions, workers))]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:  # Ctrl+C получают и процессы-воркеры, дожидаемся их выхода
+        for process in processes:
+            process.join()
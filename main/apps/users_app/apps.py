@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class UsersAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.users_app'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from . import checks  # noqa: F401 регистрация проверок конфигурации
+        from .backends import invalidate_user
+        User = self.get_model('User')
+        post_save.connect(invalidate_user, sender=User, dispatch_uid='users_app.invalidate_user_on_save')
+        post_delete.connect(invalidate_user, sender=User, dispatch_uid='users_app.invalidate_user_on_delete')
@@ -0,0 +1,32 @@
+"""
+Бэкенд аутентификации с кэшем пользователя.
+
+AuthenticationMiddleware на каждом запросе загружает пользователя по id из сессии.
+Бэкенд держит пользователя в кэше USER_CACHE_TIMEOUT секунд, запись удаляется
+при каждом сохранении или удалении пользователя (edit_user, user_is_superuser, смена пароля, вход).
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id) -> str:
+    return f'auth-user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ ModelBackend, который берёт пользователя сессии из кэша. """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+
+def invalidate_user(sender, instance, **kwargs) -> None:
+    """ Сброс кэша пользователя после сохранения или удаления (сигналы post_save, post_delete). """
+    cache.delete(user_cache_key(instance.pk))
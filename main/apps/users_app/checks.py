@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Кэши, которые у каждого процесса свои: сброс записи в одном процессе не виден в остальных.
+LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches)
+def check_user_cache(app_configs, **kwargs):
+    """
+    Проверка, что кэш пользователей сессии общий для всех процессов.
+    CachedModelBackend сбрасывает запись при сохранении пользователя только в том кэше, который видит
+    сохранивший процесс: с locmem заблокированный или лишённый прав staff пользователь
+    остаётся авторизованным в других процессах до USER_CACHE_TIMEOUT секунд.
+    """
+    if 'apps.users_app.backends.CachedModelBackend' not in settings.AUTHENTICATION_BACKENDS or settings.DEBUG:
+        return []
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES:
+        return []
+    return [Warning('Кэш пользователей сессии (CachedModelBackend) хранится в locmem, у каждого процесса свой.',
+                    hint='Для нескольких процессов задайте CACHE_BACKEND=redis или memcached.',
+                    id='users_app.W001')]
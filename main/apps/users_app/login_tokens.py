@@ -0,0 +1,141 @@
+"""
+Одноразовые токены входа через Telegram.
+
+Страница входа выдаёт токен в cookie и ссылку t.me/<бот>?start=<токен>, обработчик /start бота
+привязывает токен к пользователю, а страница входа находит пользователя по токену и сразу гасит токен.
+Токен уникален и проиндексирован, привязка дублируется в кэш token -> id пользователя,
+просроченные токены удаляет воркер (purge_expired).
+
+Пока пользователь проходит диалог с ботом, страница входа не перезагружается, а ждёт привязки
+через long-poll (wait): обработчик /start будит ожидающие запросы своего процесса сразу,
+а привязку из другого процесса (run_bot --polling) ожидание замечает при проверке кэша и БД
+раз в LOGIN_WAIT_POLL_INTERVAL секунд.
+"""
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from typing import Optional
+from .backends import user_cache_key
+from .models import User
+import asyncio
+import hashlib
+import threading
+
+_waiters = {}  # ключ токена -> {(event loop, asyncio.Event)} ожидающих запросов этого процесса
+_waiters_lock = threading.Lock()
+
+
+def cache_key(token: str) -> str:
+    """ Ключ кэша для токена: токен приходит от пользователя, поэтому в ключе только его хэш. """
+    return 'login-token:' + hashlib.sha256(token.encode()).hexdigest()
+
+
+def bind(telegram_id: int, username: Optional[str], token: str) -> User:
+    """
+    Привязка токена к пользователю Telegram (обработчик /start).
+
+    :param telegram_id: ID чата пользователя.
+    :param username: Имя пользователя в Telegram.
+    :param token: Токен из ссылки /start <токен>.
+    :return: Пользователь, к которому привязан токен.
+    """
+    expires_at = timezone.now() + timedelta(seconds=settings.LOGIN_TOKEN_TTL)
+    with transaction.atomic():
+        # Токен уникален: если им уже вошёл другой аккаунт Telegram, привязка переходит к последнему.
+        User.objects.filter(token=token).exclude(telegram_id=telegram_id).update(token=None, token_expires_at=None)
+        user, _ = User.objects.update_or_create(telegram_id=telegram_id, defaults={
+            'username': username,
+            'token': token,
+            'token_expires_at': expires_at, })
+    cache.set(cache_key(token), user.pk, settings.LOGIN_TOKEN_TTL)
+    _notify(token)
+    return user
+
+
+def _notify(token: str) -> None:
+    """ Будит запросы этого процесса, ожидающие привязки токена. """
+    with _waiters_lock:
+        waiters = _waiters.pop(cache_key(token), ())
+    for loop, event in waiters:
+        try:
+            loop.call_soon_threadsafe(event.set)  # обработчик /start работает в другом потоке
+        except RuntimeError:
+            pass  # event loop запроса уже закрыт
+
+
+def _is_bound(token: str) -> bool:
+    if cache.get(cache_key(token)) is not None:
+        return True
+    return User.objects.filter(token=token, token_expires_at__gt=timezone.now()).exists()
+
+
+async def wait(token: str, timeout: float) -> bool:
+    """
+    Ожидание привязки токена ботом.
+
+    :param token: Токен из cookie.
+    :param timeout: Сколько секунд ждать.
+    :return: True, если токен привязан, False по истечении timeout.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    key = cache_key(token)
+    waiter = (loop, asyncio.Event())
+    with _waiters_lock:
+        _waiters.setdefault(key, set()).add(waiter)  # до первой проверки, чтобы не пропустить привязку
+    try:
+        while True:
+            if await sync_to_async(_is_bound)(token):
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(waiter[1].wait(), min(remaining, settings.LOGIN_WAIT_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        with _waiters_lock:
+            waiters = _waiters.get(key)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del _waiters[key]
+
+
+def consume(token: str) -> Optional[User]:
+    """
+    Поиск пользователя по токену со страницы входа. Найденный токен гасится, повторно войти по нему нельзя.
+
+    Если привязка есть в кэше, пользователь ищется по первичному ключу,
+    иначе по уникальному индексу токена — в обоих случаях без просмотра таблицы.
+
+    :param token: Токен из cookie.
+    :return: Пользователь или None, если токен не привязан или просрочен.
+    """
+    users = User.objects.filter(token=token, token_expires_at__gt=timezone.now())
+    user_id = cache.get(cache_key(token))
+    if user_id is not None:
+        users = users.filter(pk=user_id)
+    user = users.first()
+    if user is None:
+        return None
+    # Гасим токен условно: из двух одновременных запросов войдёт только один.
+    if not User.objects.filter(pk=user.pk, token=token).update(token=None, token_expires_at=None):
+        return None
+    cache.delete_many([cache_key(token), user_cache_key(user.pk)])  # .update() не вызывает post_save
+    user.token = user.token_expires_at = None
+    return user
+
+
+def purge_expired(now=None) -> int:
+    """
+    Удаление просроченных токенов.
+
+    :param now: Текущее время, по умолчанию timezone.now().
+    :return: Сколько токенов удалено.
+    """
+    return User.objects.filter(token_expires_at__lte=now or timezone.now()).update(token=None, token_expires_at=None)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ...login_tokens import purge_expired
+
+
+class Command(BaseCommand):
+    ''' УДАЛЕНИЕ просроченных токенов входа через телеграм. '''
+    help = 'Clear expired Telegram login tokens'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Удалено просроченных токенов: {purge_expired()}.')
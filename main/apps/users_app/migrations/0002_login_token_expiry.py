@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+def clear_tokens(apps, schema_editor):
+    """
+    Токены раньше не гасились после входа и могли повторяться у разных пользователей.
+    Без срока действия они всё равно недействительны, поэтому очищаются до создания уникального индекса.
+    """
+    User = apps.get_model('users_app', 'User')
+    User.objects.exclude(token=None).update(token=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Срок действия токена'),
+        ),
+        migrations.RunPython(clear_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='token',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:41
+
+import apps.users_app.models
+from django.db import migrations, models
+
+
+def fill_channels(apps, schema_editor):
+    """ Флаги доступных каналов для существующих пользователей (исторической модели недоступен save()). """
+    User = apps.get_model('users_app', 'User')
+    User.objects.exclude(email='').update(can_email=True)
+    User.objects.filter(telegram_id__isnull=False).update(can_telegram=True)
+    valid = [user.pk for user in User.objects.exclude(phone_number=None).exclude(phone_number='').only('phone_number')
+             if user.phone_number.is_valid()]
+    for start in range(0, len(valid), 500):
+        User.objects.filter(pk__in=valid[start:start + 500]).update(can_sms=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users_app', '0002_login_token_expiry'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', apps.users_app.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='can_email',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='can_sms',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='can_telegram',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(fill_channels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import migrations
+
+
+def recheck_email(apps, schema_editor):
+    """ can_email ставился для любого непустого адреса: снимаем его с синтаксически некорректных. """
+    User = apps.get_model('users_app', 'User')
+    invalid = []
+    for user in User.objects.filter(can_email=True).only('email'):
+        try:
+            validate_email(user.email)
+        except ValidationError:
+            invalid.append(user.pk)
+    for start in range(0, len(invalid), 500):
+        User.objects.filter(pk__in=invalid[start:start + 500]).update(can_email=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users_app', '0003_user_channel_flags'),
+    ]
+
+    operations = [
+        migrations.RunPython(recheck_email, migrations.RunPython.noop),
+    ]
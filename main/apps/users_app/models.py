@@ -1,21 +1,66 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
 from django.db import models
 from phonenumber_field.modelfields import PhoneNumberField
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+
+
+def is_valid_email(value) -> bool:
+    """ Адрес, на который можно отправить письмо: синтаксическая проверка, подтверждения адреса в проекте нет. """
+    try:
+        validate_email(value)
+    except ValidationError:
+        return False
+    return True
+
+
+class UserManager(BaseUserManager):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """ bulk_create не вызывает save(), поэтому доступные каналы считаются здесь. """
+        objs = list(objs)
+        for user in objs:
+            user.update_channels()
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class User(AbstractUser):
     """
     Изменённый класс Пользователя.
-    Добавлены: номер телефона, телеграм id и токен.
+    Добавлены: номер телефона, телеграм id и токен входа через телеграм со сроком действия.
+    Флаги can_* (доступные каналы уведомлений) пересчитываются из адресов при каждом save();
+    QuerySet.update() адресов их не пересчитывает.
     """
     phone_number = PhoneNumberField(blank=True, null=True)
     telegram_id = models.PositiveBigIntegerField(verbose_name='TELEGRAM ID пользователя',
                                                  db_index=True,
                                                  null=True)
-    token = models.CharField(max_length=255, null=True, blank=True)  # Токен для авторизации через телеграм.
+    token = models.CharField(max_length=255, null=True, blank=True,
+                             unique=True)  # Одноразовый токен для авторизации через телеграм.
+    token_expires_at = models.DateTimeField(verbose_name='Срок действия токена', null=True, blank=True,
+                                            db_index=True)
+    # Доступные каналы: по ним рассылка и постановка в очередь выбирают только достижимых получателей.
+    can_email = models.BooleanField(default=False, db_index=True, editable=False)  # корректный email
+    can_sms = models.BooleanField(default=False, db_index=True, editable=False)  # номер в формате E.164
+    can_telegram = models.BooleanField(default=False, db_index=True, editable=False)  # привязан Telegram
+
+    objects = UserManager()
 
     class Meta:
         verbose_name_plural = 'Пользователи'
 
+    def update_channels(self):
+        """ Пересчёт флагов доступных каналов по адресам пользователя. """
+        self.can_email = is_valid_email(self.email)
+        self.can_sms = bool(self.phone_number) and self.phone_number.is_valid()
+        self.can_telegram = self.telegram_id is not None
+
+    def save(self, *args, **kwargs):
+        self.update_channels()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'email', 'phone_number', 'telegram_id'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'can_email', 'can_sms', 'can_telegram'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.username or f'Telegran ID: {self.telegram_id}'
@@ -1,6 +1,17 @@
-from django.test import TestCase, Client
+from datetime import timedelta
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from apps.users_app import login_tokens
+from apps.users_app.backends import user_cache_key
+from apps.users_app.checks import check_user_cache
+from asgiref.sync import sync_to_async
+from io import StringIO
+import asyncio
+import time
 
 User = get_user_model()
 
@@ -189,3 +200,190 @@ class UserViewsTestCase(TestCase):
         self.user.refresh_from_db()
         self.assertTrue(self.user.is_superuser, "Пользователь не стал суперпользователем")
         self.assertTrue(self.user.is_staff, "Пользователь не получил статус staff")
+
+
+class CachedAuthTestCase(TestCase):
+    """
+    Тесты кэша сессий и пользователя.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_authenticated_request_runs_without_queries(self):
+        """
+        Проверка, что после первого запроса сессия и пользователь берутся из кэша без запросов к БД.
+        """
+        url = reverse('main_app:index')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_saving_user_invalidates_cache(self):
+        """
+        Проверка, что edit_user и user_is_superuser сбрасывают кэш пользователя.
+        """
+        self.client.get(reverse('users_app:my_account'))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.client.post(reverse('users_app:edit_user'), {'username': 'renamed', 'email': 'new@example.com',
+                                                          'phone_number': '+79990000000'})
+        self.assertEqual(self.client.get(reverse('users_app:my_account')).context['user'].email, 'new@example.com')
+        self.client.get(reverse('users_app:user_is_superuser'))
+        self.assertTrue(self.client.get(reverse('users_app:my_account')).context['user'].is_superuser)
+
+    def test_session_of_model_backend_stays_valid(self):
+        """
+        Проверка, что сессия, созданная до включения CachedModelBackend (с бэкендом ModelBackend), не сбрасывается.
+        """
+        client = Client()
+        client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(client.get(reverse('users_app:my_account')).context['user'], self.user)
+
+    def test_local_cache_is_reported(self):
+        """
+        Проверка, что проверка конфигурации предупреждает о кэше пользователей в locmem, но не о redis.
+        """
+        with override_settings(DEBUG=False):
+            self.assertEqual([error.id for error in check_user_cache(None)], ['users_app.W001'])
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                                       'LOCATION': 'redis://127.0.0.1:6379'}}):
+                self.assertEqual(check_user_cache(None), [])
+
+
+class ChannelFlagsTestCase(TestCase):
+    """
+    Тесты флагов доступных каналов уведомлений (User.can_*).
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+
+    def test_edit_form_updates_flags(self):
+        """
+        Проверка, что флаги пересчитываются при сохранении профиля: неверный номер не делает СМС доступными.
+        """
+        self.assertFalse(self.user.can_email or self.user.can_sms or self.user.can_telegram)
+        self.client.login(username='testuser', password='testpassword')
+        self.client.post(reverse('users_app:edit_user'), {'username': 'testuser', 'email': 'test@example.com',
+                                                          'phone_number': '+79990000000'})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.can_email and self.user.can_sms)
+        self.user.email = 'not-an-address'
+        self.user.save(update_fields=['email'])
+        self.assertFalse(User.objects.get(pk=self.user.pk).can_email)
+        self.user.phone_number = '+15550000001'  # не номер E.164 реального плана нумерации
+        self.user.save(update_fields=['phone_number'])
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.can_sms)
+
+    def test_bot_start_links_telegram(self):
+        """
+        Проверка, что привязка Telegram обработчиком /start делает канал доступным.
+        """
+        user = login_tokens.bind(555, 'tguser', 'abc')
+        self.assertTrue(User.objects.get(pk=user.pk).can_telegram)
+
+    def test_bulk_create_sets_flags(self):
+        """
+        Проверка, что bulk_create (без save()) тоже заполняет флаги.
+        """
+        User.objects.bulk_create([User(username='a', email='a@example.com'), User(username='b', telegram_id=1)])
+        self.assertEqual(list(User.objects.filter(can_email=True).values_list('username', flat=True)), ['a'])
+        self.assertEqual(list(User.objects.filter(can_telegram=True).values_list('username', flat=True)), ['b'])
+
+
+class TelegramLoginTokenTestCase(TestCase):
+    """
+    Тесты одноразовых токенов входа через Telegram.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bound_token_logs_in_once(self):
+        """
+        Проверка, что привязанный ботом токен из cookie выполняет вход один раз и гасится.
+        """
+        user = login_tokens.bind(555, 'tguser', 'abc')
+        self.client.cookies['token'] = 'abc'
+        response = self.client.get(reverse('users_app:login'))
+        self.assertRedirects(response, reverse('main_app:index'), fetch_redirect_response=False)
+        user.refresh_from_db()
+        self.assertIsNone(user.token)
+        self.assertIsNone(login_tokens.consume('abc'))
+
+    def test_lookup_without_cache_uses_index(self):
+        """
+        Проверка, что без записи в кэше пользователь находится по токену в БД.
+        """
+        user = login_tokens.bind(555, 'tguser', 'abc')
+        cache.clear()
+        self.assertEqual(login_tokens.consume('abc'), user)
+
+    def test_expired_token_is_rejected_and_purged(self):
+        """
+        Проверка, что просроченный токен не даёт войти и удаляется командой purge_login_tokens.
+        """
+        user = login_tokens.bind(555, 'tguser', 'abc')
+        User.objects.filter(pk=user.pk).update(token_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(login_tokens.consume('abc'))
+        out = StringIO()
+        call_command('purge_login_tokens', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertFalse(User.objects.filter(token='abc').exists())
+
+    def test_token_moves_to_latest_telegram_account(self):
+        """
+        Проверка, что токен уникален: повторная привязка к другому аккаунту снимает его с прежнего.
+        """
+        first = login_tokens.bind(555, 'first', 'abc')
+        second = login_tokens.bind(777, 'second', 'abc')
+        first.refresh_from_db()
+        self.assertIsNone(first.token)
+        self.assertEqual(login_tokens.consume('abc'), second)
+
+
+class TelegramLoginWaitTestCase(TransactionTestCase):
+    """
+    Тесты long-poll ожидания входа через Telegram.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bind_wakes_waiting_request(self):
+        """
+        Проверка, что привязка токена ботом сразу будит ожидающий запрос, не дожидаясь опроса БД.
+        """
+        async def scenario():
+            waiting = asyncio.create_task(login_tokens.wait('abc', timeout=5))
+            await asyncio.sleep(0.05)
+            started = time.monotonic()
+            await sync_to_async(login_tokens.bind, thread_sensitive=False)(555, 'tguser', 'abc')
+            return await waiting, time.monotonic() - started
+
+        with override_settings(LOGIN_WAIT_POLL_INTERVAL=5):
+            bound, elapsed = asyncio.run(scenario())
+        self.assertTrue(bound)
+        self.assertLess(elapsed, 1)
+
+    @override_settings(LOGIN_WAIT_TIMEOUT=0.1, LOGIN_WAIT_POLL_INTERVAL=0.05)
+    def test_wait_view_logs_in_or_times_out(self):
+        """
+        Проверка, что ожидание без привязки отвечает status=waiting, а после привязки выполняет вход.
+        """
+        self.client.cookies['token'] = 'abc'
+        url = reverse('users_app:login_wait')
+        self.assertEqual(self.client.get(url).json(), {'status': 'waiting'})
+        user = login_tokens.bind(555, 'tguser', 'abc')
+        self.assertEqual(self.client.get(url).json(), {'status': 'login', 'redirect': reverse('main_app:index')})
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+
+    def test_wait_view_requires_token(self):
+        """
+        Проверка, что ожидание без cookie с токеном отклоняется.
+        """
+        self.assertEqual(self.client.get(reverse('users_app:login_wait')).status_code, 400)
@@ -4,6 +4,7 @@ from . import views
 app_name = 'users_app'
 urlpatterns = [
     path('login/', views.login_view, name='login'), # страница авторизации
+    path('login/wait', views.login_wait, name='login_wait'), # ожидание входа через телеграм (long-poll)
     path('register/', views.register, name='register'), # страница регистрации
     path('logout', views.logout_view, name='logout'),   # выход пользователя
     path('my_account', views.my_account, name='my_account'),    # страница профиля
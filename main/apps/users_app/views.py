@@ -1,12 +1,14 @@
 from typing import Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth import logout, login, authenticate
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.urls import reverse
 from .forms import RegisterForm, EditUserForm
-from .models import User
+from . import login_tokens
 import uuid
-import os
 
 
 def login_telegram(request: HttpRequest) -> HttpResponse:
@@ -15,7 +17,7 @@ def login_telegram(request: HttpRequest) -> HttpResponse:
 
     Если пользователь уже аутентифицирован, перенаправляет на главную страницу.
     Иначе пытается получить токен из cookie, создать нового или авторизовать пользователя по токену.
-    Устанавливает cookie с токеном на 12 часов.
+    Токен одноразовый: после входа он гасится. Устанавливает cookie с токеном на LOGIN_TOKEN_TTL секунд.
 
     :param request: Объект HTTP-запроса.
     :return: HTTP-ответ с рендерингом страницы входа или редиректом.
@@ -27,16 +29,45 @@ def login_telegram(request: HttpRequest) -> HttpResponse:
     if token is None:
         token = str(uuid.uuid4())
     else:
-        user = User.objects.filter(token=token).first()
+        user = login_tokens.consume(token)
         if user:
-            login(request, user)
+            login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
             response = redirect('main_app:index')
             response.delete_cookie('token')  # Удалить существующий cookie
             return response
 
-    context = {'TELEGRAM_BOT_NAME': os.getenv("TELEGRAM_BOT_NAME"), 'token': token}
+    context = {'TELEGRAM_BOT_NAME': settings.TELEGRAM_BOT_NAME, 'token': token}
     response = render(request, 'users_app/login.html', context)
-    response.set_cookie('token', token, max_age=60 * 60 * 12)  # Устанавливаем cookie на 12 часов
+    response.set_cookie('token', token, max_age=settings.LOGIN_TOKEN_TTL)  # cookie живёт столько же, сколько токен
+    return response
+
+
+def _login_by_token(request: HttpRequest, token: str) -> bool:
+    user = login_tokens.consume(token)
+    if user is None:
+        return False
+    login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
+    return True
+
+
+async def login_wait(request: HttpRequest) -> HttpResponse:
+    """
+    Long-poll ожидание входа через Telegram со страницы входа.
+
+    Запрос ждёт до LOGIN_WAIT_TIMEOUT секунд, пока бот не привяжет токен из cookie,
+    и сразу выполняет вход. Страница повторяет запрос, пока не получит status=login.
+
+    :param request: Объект HTTP-запроса с cookie token.
+    :return: JSON со status=login и адресом перехода, status=waiting по таймауту или 400 без токена.
+    """
+    token = request.COOKIES.get('token')
+    if not token:
+        return HttpResponseBadRequest()
+    if not await login_tokens.wait(token, settings.LOGIN_WAIT_TIMEOUT) \
+            or not await sync_to_async(_login_by_token)(request, token):
+        return JsonResponse({'status': 'waiting'})
+    response = JsonResponse({'status': 'login', 'redirect': reverse('main_app:index')})
+    response.delete_cookie('token')
     return response
 
 
@@ -94,7 +125,7 @@ def register(request: HttpRequest) -> HttpResponse:
         form = RegisterForm(data=request.POST)
         if form.is_valid():
             new_user = form.save()
-            login(request, new_user)
+            login(request, new_user, backend=settings.AUTHENTICATION_BACKENDS[0])
             return redirect('main_app:index')
         else:
             context = {'error': True, 'form': form}
@@ -0,0 +1,197 @@
+"""
+Конфигурация провайдеров и бота.
+
+Переменные окружения (и .env) читаются один раз при запуске процесса в settings.py,
+дальше код обращается только к django.conf.settings.
+"""
+from dataclasses import dataclass, fields
+import os
+import re
+
+TELEGRAM_TOKEN_RE = re.compile(r'^\d+:[\w-]{20,}$')
+PHONE_RE = re.compile(r'^\+\d{7,15}$')
+DATABASE_ENGINES = ('', 'sqlite', 'postgresql')
+DEFAULT_CONN_MAX_AGE = 60
+CACHE_BACKENDS = {
+    '': 'django.core.cache.backends.locmem.LocMemCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+CACHE_LOCATIONS = {'redis': 'redis://127.0.0.1:6379', 'memcached': '127.0.0.1:11211'}
+
+
+@dataclass(frozen=True)
+class EmailConfig:
+    host_user: str = ''
+    host_password: str = ''
+
+
+@dataclass(frozen=True)
+class TwilioConfig:
+    account_sid: str = ''
+    auth_token: str = ''
+    phone_number: str = ''
+    api_url: str = ''  # адрес вместо https://api.twilio.com (заглушка для замеров)
+
+
+@dataclass(frozen=True)
+class TelegramConfig:
+    bot_token: str = ''
+    bot_name: str = ''
+    webhook_url: str = ''
+    webhook_secret: str = ''
+
+
+@dataclass(frozen=True)
+class DatabaseConfig:
+    engine: str = ''  # sqlite (по умолчанию) или postgresql
+    name: str = ''  # путь к файлу SQLite или имя базы PostgreSQL
+    user: str = ''
+    password: str = ''
+    host: str = ''
+    port: str = ''
+    conn_max_age: str = ''  # секунд держать соединение открытым, по умолчанию 60
+
+
+@dataclass(frozen=True)
+class CacheConfig:
+    backend: str = ''  # locmem (по умолчанию), file, redis или memcached
+    location: str = ''  # каталог для file, адрес сервера для redis и memcached
+
+
+@dataclass(frozen=True)
+class Config:
+    secret_key: str = ''
+    domain: str = ''
+    metrics_token: str = ''  # Bearer-токен, с которым Prometheus читает /metrics
+    metrics_allowed_ips: str = ''  # адреса через запятую, которым /metrics доступен без токена
+    email: EmailConfig = EmailConfig()
+    twilio: TwilioConfig = TwilioConfig()
+    telegram: TelegramConfig = TelegramConfig()
+    database: DatabaseConfig = DatabaseConfig()
+    cache: CacheConfig = CacheConfig()
+
+    # Переменные окружения, обязательные для работы каналов и бота.
+    REQUIRED = {
+        'DJANGO_SECRET_KEY': 'secret_key',
+        'DOMAIN': 'domain',
+        'EMAIL_HOST_USER': 'email.host_user',
+        'EMAIL_HOST_PASSWORD': 'email.host_password',
+        'TWILIO_ACCOUNT_SID': 'twilio.account_sid',
+        'TWILIO_AUTH_TOKEN': 'twilio.auth_token',
+        'TWILIO_PHONE_NUMBER': 'twilio.phone_number',
+        'TELEGRAM_BOT_TOKEN': 'telegram.bot_token',
+        'TELEGRAM_BOT_NAME': 'telegram.bot_name',
+    }
+
+    def get(self, path):
+        value = self
+        for name in path.split('.'):
+            value = getattr(value, name)
+        return value
+
+    def missing(self):
+        """ Незаполненные обязательные переменные окружения. """
+        return [env for env, path in self.REQUIRED.items() if not self.get(path)]
+
+    def invalid(self):
+        """ Заполненные, но некорректные значения: (переменная, описание ошибки). """
+        problems = []
+        if self.twilio.account_sid and not self.twilio.account_sid.startswith('AC'):
+            problems.append(('TWILIO_ACCOUNT_SID', 'должен начинаться с AC'))
+        if self.twilio.phone_number and not PHONE_RE.match(self.twilio.phone_number):
+            problems.append(('TWILIO_PHONE_NUMBER', 'номер в формате E.164, например +15005550006'))
+        if self.telegram.bot_token and not TELEGRAM_TOKEN_RE.match(self.telegram.bot_token):
+            problems.append(('TELEGRAM_BOT_TOKEN', 'токен вида 123456:ABC... от @BotFather'))
+        if self.telegram.webhook_url and not self.telegram.webhook_url.startswith('https://'):
+            problems.append(('TELEGRAM_WEBHOOK_URL', 'Telegram принимает только https-адреса'))
+        if self.database.engine not in DATABASE_ENGINES:
+            problems.append(('DB_ENGINE', 'sqlite или postgresql'))
+        if self.database.conn_max_age and not self.database.conn_max_age.isdigit():
+            problems.append(('DB_CONN_MAX_AGE', 'целое число секунд'))
+        if self.cache.backend not in CACHE_BACKENDS:
+            problems.append(('CACHE_BACKEND', 'locmem, file, redis или memcached'))
+        return problems
+
+
+def _section(cls, environ, prefix):
+    return cls(**{field.name: environ.get(f'{prefix}{field.name.upper()}', '') for field in fields(cls)})
+
+
+def load(environ=os.environ):
+    """
+    Сборка конфигурации из переменных окружения.
+
+    :param environ: Источник переменных, по умолчанию os.environ.
+    :return: Неизменяемый Config.
+    """
+    return Config(
+        secret_key=environ.get('DJANGO_SECRET_KEY', ''),
+        domain=environ.get('DOMAIN', ''),
+        metrics_token=environ.get('METRICS_TOKEN', ''),
+        metrics_allowed_ips=environ.get('METRICS_ALLOWED_IPS', ''),
+        email=_section(EmailConfig, environ, 'EMAIL_'),
+        twilio=_section(TwilioConfig, environ, 'TWILIO_'),
+        telegram=_section(TelegramConfig, environ, 'TELEGRAM_'),
+        database=_section(DatabaseConfig, environ, 'DB_'),
+        cache=_section(CacheConfig, environ, 'CACHE_'),
+    )
+
+
+def database(db, base_dir):
+    """
+    Настройки DATABASES['default'] по конфигурации.
+
+    Оба варианта держат соединение открытым CONN_MAX_AGE секунд и проверяют его перед
+    повторным использованием (CONN_HEALTH_CHECKS), а не открывают новое на каждый запрос.
+    SQLite работает в режиме WAL с ожиданием блокировки (core.db.sqlite3),
+    PostgreSQL требует пакет psycopg.
+
+    :param db: DatabaseConfig.
+    :param base_dir: Каталог проекта для файла db.sqlite3 по умолчанию.
+    :return: Словарь настроек базы данных.
+    """
+    common = {
+        'CONN_MAX_AGE': int(db.conn_max_age) if db.conn_max_age.isdigit() else DEFAULT_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if db.engine == 'postgresql':
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': db.name or 'sending_messages',
+            'USER': db.user,
+            'PASSWORD': db.password,
+            'HOST': db.host or 'localhost',
+            'PORT': db.port or '5432',
+            **common,
+        }
+    return {
+        'ENGINE': 'core.db.sqlite3',
+        'NAME': db.name or base_dir / 'db.sqlite3',
+        'OPTIONS': {
+            'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 20000},
+            'transaction_mode': 'IMMEDIATE',
+        },
+        **common,
+    }
+
+
+def cache(config, base_dir):
+    """
+    Настройки CACHES['default'] по конфигурации.
+
+    locmem и file не требуют сервера, но кэш locmem у каждого процесса свой.
+    Общий кэш для веб-воркеров, бота и воркера — redis (пакет redis) или memcached (пакет pymemcache).
+
+    :param config: CacheConfig.
+    :param base_dir: Каталог проекта для кэша file по умолчанию.
+    :return: Словарь настроек кэша.
+    """
+    backend = config.backend if config.backend in CACHE_BACKENDS else ''
+    if backend == 'file':
+        location = config.location or str(base_dir / '.cache')
+    else:
+        location = config.location or CACHE_LOCATIONS.get(backend, 'default')
+    return {'BACKEND': CACHE_BACKENDS[backend], 'LOCATION': location}
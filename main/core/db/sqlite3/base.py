@@ -0,0 +1,34 @@
+"""
+SQLite с настройками для нескольких процессов (веб-воркеры, бот, воркер отправки).
+
+ENGINE = 'core.db.sqlite3'. Дополнительные ключи OPTIONS:
+- pragmas: PRAGMA, которые выполняются на каждом новом соединении
+  (journal_mode=WAL — читатели не ждут писателя, busy_timeout — писатель ждёт блокировку,
+  а не падает с "database is locked", synchronous=NORMAL — без fsync на каждый коммит в WAL);
+- transaction_mode: как начинать транзакции atomic(), например IMMEDIATE — транзакция сразу
+  берёт блокировку записи. Иначе транзакция, которая сначала читает, а потом пишет
+  (update_or_create, select_for_update), получает "database is locked" без ожидания busy_timeout,
+  если между чтением и записью писал другой процесс. Django поддерживает этот ключ с версии 5.1.
+"""
+from django.db.backends.sqlite3 import base
+
+EXTRA_OPTIONS = ('pragmas', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for option in EXTRA_OPTIONS:
+            kwargs.pop(option, None)  # sqlite3.connect о них не знает
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
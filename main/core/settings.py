@@ -1,9 +1,11 @@
 from pathlib import Path
 from dotenv import load_dotenv
+from . import config
 import os
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
 load_dotenv()
+CONFIG = config.load()  # окружение читается один раз при запуске процесса
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -14,7 +16,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.getenv("DJANGO_SECRET_KEY")
+SECRET_KEY = CONFIG.secret_key
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -72,14 +74,28 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite (WAL) по умолчанию или PostgreSQL: DB_ENGINE=postgresql, см. core/config.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': config.database(CONFIG.database, BASE_DIR),
 }
 
 
+# Кэш: CACHE_BACKEND=locmem (по умолчанию), file, redis или memcached, см. core/config.py
+CACHES = {
+    'default': config.cache(CONFIG.cache, BASE_DIR),
+}
+
+# Сессия читается из кэша, в БД — только при промахе и записи.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Пользователь сессии тоже берётся из кэша (сбрасывается при сохранении пользователя).
+AUTHENTICATION_BACKENDS = [
+    'apps.users_app.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',  # сессии, созданные до CachedModelBackend, остаются действительными
+]
+USER_CACHE_TIMEOUT = 60 * 15  # секунд
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -108,7 +124,7 @@ TIME_ZONE = 'Asia/Yekaterinburg'
 
 USE_I18N = False
 
-USE_TZ = False
+USE_TZ = True  # в БД время хранится в UTC, TIME_ZONE — для отображения и расписаний
 
 
 # Static files (CSS, JavaScript, Images)
@@ -123,10 +139,57 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = '/users_app/login/'
 
 AUTH_USER_MODEL = 'users_app.User'
+LOGIN_TOKEN_TTL = 60 * 60 * 12  # секунд действует токен входа через телеграм (как cookie на странице входа)
+LOGIN_TOKEN_PURGE_INTERVAL = 60 * 10  # как часто воркер удаляет просроченные токены, секунд
+LOGIN_WAIT_TIMEOUT = 25  # секунд держится long-poll ожидания входа через телеграм
+LOGIN_WAIT_POLL_INTERVAL = 2  # как часто ожидание проверяет кэш и БД (бот в другом процессе), секунд
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
-EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
-EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
\ No newline at end of file
+EMAIL_HOST_USER = CONFIG.email.host_user
+EMAIL_HOST_PASSWORD = CONFIG.email.host_password
+EMAIL_TIMEOUT = 10  # секунд на операции SMTP (письма уведомлений ограничены NOTIFICATION_CHANNEL_TIMEOUT)
+EMAIL_IDLE_TIMEOUT = 60  # через сколько секунд простоя переоткрыть SMTP-соединение
+EMAIL_MAX_MESSAGES_PER_CONNECTION = 100  # писем через одно SMTP-соединение
+EMAIL_BATCH_SIZE = 10  # писем в одной пачке конвейера отправки (NOTIFICATION_CHANNELS OPTIONS: batch_size)
+
+TWILIO_ACCOUNT_SID = CONFIG.twilio.account_sid
+TWILIO_AUTH_TOKEN = CONFIG.twilio.auth_token
+TWILIO_PHONE_NUMBER = CONFIG.twilio.phone_number
+TWILIO_POOL_SIZE = 16  # keep-alive соединений к API Twilio
+TWILIO_API_URL = CONFIG.twilio.api_url  # адрес вместо https://api.twilio.com (заглушка для замеров)
+
+# Notifications
+# Бэкенды каналов доставки: канал -> класс бэкенда и его параметры.
+# Для тестов и замеров есть apps.main_app.backends.locmem.LocmemBackend
+# и apps.main_app.backends.filebased.FileBackend.
+NOTIFICATION_CHANNELS = {
+    'email': {'BACKEND': 'apps.main_app.backends.email.EmailBackend'},
+    'sms': {'BACKEND': 'apps.main_app.backends.sms.SmsBackend'},
+    'telegram': {'BACKEND': 'apps.main_app.backends.telegram.TelegramBackend'},
+}
+NOTIFICATION_CHANNEL_TIMEOUT = 10  # таймаут сокетов SMTP, Twilio, Telegram на одно сообщение, секунд
+NOTIFICATION_FANOUT_WORKERS = 12  # потоков для параллельной отправки по каналам
+NOTIFICATION_MAX_ATTEMPTS = 5  # попыток по каналу до перевода в dead-letter
+NOTIFICATION_RETRY_BASE_DELAY = 30  # секунд до первой повторной попытки
+NOTIFICATION_RETRY_MAX_DELAY = 60 * 60  # максимальная задержка между попытками
+NOTIFICATION_LEASE_TIMEOUT = 300  # секунд, на которые воркер забирает пачку доставок (не меньше notifications.batch_time)
+SCHEDULER_HORIZON = 60 * 5  # на сколько секунд вперёд планировщик держит записи в памяти
+SCHEDULER_REFRESH_INTERVAL = 30  # как часто планировщик перечитывает ближайшие записи, секунд
+SCHEDULER_PREFETCH = 10000  # не больше записей в памяти планировщика
+NOTIFICATION_IDEMPOTENCY_WINDOW = 60  # секунд, в течение которых одинаковый запрос не отправляется повторно
+DOMAIN = CONFIG.domain  # домен сайта для ссылок из бота
+TELEGRAM_BOT_TOKEN = CONFIG.telegram.bot_token
+TELEGRAM_BOT_NAME = CONFIG.telegram.bot_name
+TELEGRAM_WEBHOOK_URL = CONFIG.telegram.webhook_url  # https://<домен>/telegram/webhook/
+TELEGRAM_WEBHOOK_SECRET = CONFIG.telegram.webhook_secret  # X-Telegram-Bot-Api-Secret-Token
+TELEGRAM_GLOBAL_RATE = 30  # сообщений в секунду на бота (лимит Telegram) на узел, делится между воркерами пула
+TELEGRAM_CHAT_RATE = 1  # сообщений в секунду в один чат (лимит Telegram)
+METRICS_TOKEN = CONFIG.metrics_token  # /metrics доступен staff, по этому токену или с METRICS_ALLOWED_IPS
+METRICS_ALLOWED_IPS = [ip.strip() for ip in CONFIG.metrics_allowed_ips.split(',') if ip.strip()]
+METRICS_QUEUE_DEPTH_TTL = 5  # секунд между пересчётами глубины очереди для /metrics
+METRICS_BOT_PORT = 9101  # метрики Prometheus процесса run_bot (polling)
+METRICS_WORKER_PORT = 9102  # метрики Prometheus процесса send_notifications
+ASYNC_BOT_CONCURRENCY = 100  # обновлений одновременно в асинхронном боте (run_bot --async)
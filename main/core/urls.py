@@ -3,11 +3,14 @@ from django.urls import path, include, re_path
 from django.views.static import serve
 from django.conf.urls.static import static
 from django.conf import settings
+from apps.main_app.views import metrics_view, telegram_webhook
 
 urlpatterns = [
     path('', include('apps.main_app.urls')),
     path('admin/', admin.site.urls),
     path('users_app/', include('apps.users_app.urls')),
+    path('telegram/webhook/', telegram_webhook, name='telegram_webhook'),  # обновления Telegram-бота
+    path('metrics', metrics_view, name='metrics'),  # метрики Prometheus
     re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
     re_path(r'^static/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),
 ]